@@ -1,7 +1,12 @@
 import pyray as pr
 import math
+import numpy as np
+from fractions import Fraction
 from pyray import Vector3
-import random
+
+# Plans de découpe utilisés par raylib (RL_CULL_DISTANCE_NEAR / RL_CULL_DISTANCE_FAR)
+CAMERA_NEAR = 0.01
+CAMERA_FAR = 1000.0
 
 def initialize_camera():
     """Initialise la caméra 3D."""
@@ -14,7 +19,442 @@ def initialize_camera():
     )
     return camera
 
-def generate_maze_path(nb_segments, taille_grille=15, longueur_segment=1.0, activer_3d=False):
+def camera_view_matrix(camera):
+    """Calcule la matrice de vue 4x4 (look-at) de la caméra, comme MatrixLookAt de raylib."""
+    eye = np.array([camera.position.x, camera.position.y, camera.position.z], dtype=np.float64)
+    target = np.array([camera.target.x, camera.target.y, camera.target.z], dtype=np.float64)
+    up = np.array([camera.up.x, camera.up.y, camera.up.z], dtype=np.float64)
+
+    forward = eye - target
+    forward /= np.linalg.norm(forward)
+    right = np.cross(up, forward)
+    right /= np.linalg.norm(right)
+    true_up = np.cross(forward, right)
+
+    view = np.eye(4)
+    view[0, :3] = right
+    view[1, :3] = true_up
+    view[2, :3] = forward
+    view[:3, 3] = -view[:3, :3] @ eye
+    return view
+
+def camera_projection_matrix(camera, aspect, near=CAMERA_NEAR, far=CAMERA_FAR):
+    """Calcule la matrice de projection 4x4 de la caméra (perspective ou orthographique)."""
+    projection = np.zeros((4, 4))
+    if camera.projection == pr.CAMERA_ORTHOGRAPHIC:
+        top = camera.fovy / 2
+        right = top * aspect
+        projection[0, 0] = 1 / right
+        projection[1, 1] = 1 / top
+        projection[2, 2] = -2 / (far - near)
+        projection[2, 3] = -(far + near) / (far - near)
+        projection[3, 3] = 1
+    else:
+        f = 1 / math.tan(math.radians(camera.fovy) / 2)
+        projection[0, 0] = f / aspect
+        projection[1, 1] = f
+        projection[2, 2] = -(far + near) / (far - near)
+        projection[2, 3] = -2 * far * near / (far - near)
+        projection[3, 2] = -1
+    return projection
+
+def camera_view_projection_matrix(camera, width, height):
+    """Retourne la matrice vue-projection de la caméra pour un écran de taille width x height."""
+    return camera_projection_matrix(camera, width / height) @ camera_view_matrix(camera)
+
+def screen_to_world_ray(camera, screen_x, screen_y, width, height):
+    """
+    Transforme une position écran (ex. la souris) en rayon 3D passant par la caméra.
+
+    :return: (origine, direction normalisée) sous forme de tableaux numpy de taille 3.
+    """
+    inverse_view_projection = np.linalg.inv(camera_view_projection_matrix(camera, width, height))
+    ndc_x = 2 * screen_x / width - 1
+    ndc_y = 1 - 2 * screen_y / height
+
+    near_point = inverse_view_projection @ np.array([ndc_x, ndc_y, -1, 1])
+    far_point = inverse_view_projection @ np.array([ndc_x, ndc_y, 1, 1])
+    near_point = near_point[:3] / near_point[3]
+    far_point = far_point[:3] / far_point[3]
+
+    direction = far_point - near_point
+    direction /= np.linalg.norm(direction)
+    if camera.projection == pr.CAMERA_ORTHOGRAPHIC:
+        origin = near_point
+    else:
+        origin = np.array([camera.position.x, camera.position.y, camera.position.z], dtype=np.float64)
+    return origin, direction
+
+def extract_frustum_planes(view_projection):
+    """
+    Extrait les 6 plans du frustum d'une matrice vue-projection (méthode de Gribb-Hartmann).
+
+    :return: Tableau (6, 4) de plans normalisés (a, b, c, d) ; un point p est à l'intérieur si a*x + b*y + c*z + d >= 0 pour chaque plan.
+    """
+    m = view_projection
+    planes = np.array([m[3] + m[0], m[3] - m[0], m[3] + m[1], m[3] - m[1], m[3] + m[2], m[3] - m[2]])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+def camera_frustum_planes(camera, width, height):
+    """Retourne les plans du frustum de la caméra pour un écran de taille width x height."""
+    return extract_frustum_planes(camera_view_projection_matrix(camera, width, height))
+
+def spheres_in_frustum(planes, centers, radii):
+    """Teste K sphères (centres (K, 3), rayons (K,) ou scalaire) contre le frustum ; retourne un masque booléen (K,)."""
+    distances = np.asarray(centers, dtype=np.float64) @ planes[:, :3].T + planes[:, 3]
+    return np.all(distances >= -np.reshape(radii, (-1, 1)), axis=1)
+
+def aabbs_in_frustum(planes, box_min, box_max):
+    """Teste K boîtes englobantes (coins (K, 3)) contre le frustum ; retourne un masque booléen (K,)."""
+    box_min = np.asarray(box_min, dtype=np.float64)
+    box_max = np.asarray(box_max, dtype=np.float64)
+    centers = (box_min + box_max) / 2
+    extents = (box_max - box_min) / 2
+    distances = centers @ planes[:, :3].T + planes[:, 3] + extents @ np.abs(planes[:, :3]).T
+    return np.all(distances >= 0, axis=1)
+
+def new_cull_stats():
+    """Crée les compteurs de culling d'une image : éléments testés, éliminés et dessinés."""
+    return {"tested": 0, "culled": 0, "drawn": 0}
+
+def record_culling(stats, visible):
+    """Ajoute le résultat d'un test de culling (masque booléen) aux compteurs de l'image."""
+    if stats is None:
+        return
+    drawn = int(np.count_nonzero(visible))
+    stats["tested"] += visible.size
+    stats["drawn"] += drawn
+    stats["culled"] += visible.size - drawn
+
+def build_cull_index(vertices, faces, edges, chunk_size=64):
+    """
+    Précalcule, pour un mesh statique, les boîtes englobantes utilisées par cull_mesh :
+    une boîte par bloc de chunk_size faces consécutives, une boîte (centre, demi-taille) par arête
+    et une boîte par bloc de chunk_size arêtes consécutives.
+
+    :return: Dictionnaire décrivant l'index.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces)
+    edges = np.asarray(edges)
+
+    triangles = vertices[faces]
+    starts = np.arange(0, len(faces), chunk_size)
+    segments = vertices[edges]
+    edge_min, edge_max = segments.min(axis=1), segments.max(axis=1)
+    edge_starts = np.arange(0, len(edges), chunk_size)
+    return {
+        "vertices": vertices,
+        "nb_faces": len(faces),
+        "chunk_size": chunk_size,
+        "chunk_starts": starts,
+        "chunk_min": np.minimum.reduceat(triangles.min(axis=1), starts, axis=0),
+        "chunk_max": np.maximum.reduceat(triangles.max(axis=1), starts, axis=0),
+        "edge_centers": (edge_min + edge_max) / 2,
+        "edge_extents": (edge_max - edge_min) / 2,
+        "edge_starts": edge_starts,
+        "edge_chunk_min": np.minimum.reduceat(edge_min, edge_starts, axis=0) if len(edges) else edge_min,
+        "edge_chunk_max": np.maximum.reduceat(edge_max, edge_starts, axis=0) if len(edges) else edge_max,
+    }
+
+def cull_mesh(planes, vertices, faces, edges, vertex_radius=0.05, chunk_size=64, stats=None, index=None):
+    """
+    Détermine les faces, arêtes et sommets d'un mesh à dessiner.
+    Les faces sont testées par blocs de chunk_size faces consécutives (une boîte englobante par bloc),
+    les arêtes par leur boîte et les sommets par une sphère de rayon vertex_radius.
+    Pour un mesh statique, passer index (build_cull_index) évite de recalculer les boîtes à chaque appel :
+    seul le test contre les plans du frustum reste.
+
+    :return: (indices des faces, indices des arêtes, indices des sommets) visibles.
+    """
+    if index is None:
+        index = build_cull_index(vertices, faces, edges, chunk_size)
+    starts, chunk_size = index["chunk_starts"], index["chunk_size"]
+
+    visible_chunks = aabbs_in_frustum(planes, index["chunk_min"], index["chunk_max"])
+    record_culling(stats, visible_chunks)
+    face_ids = (starts[visible_chunks, None] + np.arange(chunk_size)).ravel()
+    face_ids = face_ids[face_ids < index["nb_faces"]]
+
+    # Arêtes : d'abord par blocs ; seules les arêtes des blocs coupés par le frustum sont testées une à une
+    edge_starts = index["edge_starts"]
+    nb_edges = len(index["edge_centers"])
+    chunk_centers = (index["edge_chunk_min"] + index["edge_chunk_max"]) / 2
+    chunk_extents = (index["edge_chunk_max"] - index["edge_chunk_min"]) / 2
+    chunk_distances = chunk_centers @ planes[:, :3].T + planes[:, 3]
+    chunk_spread = chunk_extents @ np.abs(planes[:, :3]).T
+    touching = np.all(chunk_distances + chunk_spread >= 0, axis=1)
+    inside = np.all(chunk_distances - chunk_spread >= 0, axis=1)
+
+    def chunk_edges(chunks):
+        ids = (edge_starts[chunks, None] + np.arange(chunk_size)).ravel()
+        return ids[ids < nb_edges]
+
+    visible_edges = np.zeros(nb_edges, dtype=bool)
+    visible_edges[chunk_edges(inside)] = True
+    candidates = chunk_edges(touching & ~inside)
+    distances = (index["edge_centers"][candidates] @ planes[:, :3].T + planes[:, 3]
+                 + index["edge_extents"][candidates] @ np.abs(planes[:, :3]).T)
+    visible_edges[candidates] = np.all(distances >= 0, axis=1)
+    record_culling(stats, visible_edges)
+
+    visible_vertices = spheres_in_frustum(planes, index["vertices"], vertex_radius)
+    record_culling(stats, visible_vertices)
+
+    return face_ids, np.flatnonzero(visible_edges), np.flatnonzero(visible_vertices)
+
+def morton_codes(points):
+    """Calcule les codes de Morton (Z-order, 10 bits par axe) de points normalisés dans leur boîte englobante."""
+    pmin = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - pmin, 1e-12)
+    grid = np.clip(((points - pmin) / extent * 1023).astype(np.uint64), 0, 1023)
+
+    codes = np.zeros(len(points), dtype=np.uint64)
+    for axis in range(3):
+        x = grid[:, axis]
+        x = (x | (x << np.uint64(16))) & np.uint64(0x030000FF)
+        x = (x | (x << np.uint64(8))) & np.uint64(0x0300F00F)
+        x = (x | (x << np.uint64(4))) & np.uint64(0x030C30C3)
+        x = (x | (x << np.uint64(2))) & np.uint64(0x09249249)
+        codes |= x << np.uint64(axis)
+    return codes
+
+def _random_spanning_tree(width, height, rng):
+    """
+    Arbre couvrant aléatoire de la grille width x height (arbre couvrant minimal pour des poids aléatoires,
+    algorithme de Borůvka vectorisé : chaque composante choisit son arête la plus légère à chaque tour).
+
+    :return: (droite, haut) : tableaux booléens (width, height) indiquant si la cellule (i, j) est reliée
+             à (i + 1, j), respectivement à (i, j + 1).
+    """
+    ids = np.arange(width * height).reshape(width, height)
+    u = np.concatenate([ids[:-1, :].ravel(), ids[:, :-1].ravel()])
+    v = np.concatenate([ids[1:, :].ravel(), ids[:, 1:].ravel()])
+    weights = rng.permutation(len(u))
+    edge_of_weight = np.argsort(weights)
+    in_tree = np.zeros(len(u), dtype=bool)
+    component = np.arange(width * height)
+    candidates = np.arange(len(u))
+    while True:
+        cu, cv = component[u[candidates]], component[v[candidates]]
+        outside = cu != cv
+        candidates, cu, cv = candidates[outside], cu[outside], cv[outside]
+        if len(candidates) == 0:
+            break
+        lightest = np.full(width * height, len(u))
+        np.minimum.at(lightest, cu, weights[candidates])
+        np.minimum.at(lightest, cv, weights[candidates])
+        roots = np.flatnonzero(lightest < len(u))
+        chosen = edge_of_weight[lightest[roots]]
+        in_tree[chosen] = True
+
+        # Chaque composante s'accroche à celle de l'autre bout de son arête ; les paires mutuelles
+        # sont cassées en gardant le plus petit indice comme racine, puis les pointeurs sont compressés
+        a, b = component[u[chosen]], component[v[chosen]]
+        other = np.where(a == roots, b, a)
+        parent = np.arange(width * height)
+        parent[roots] = other
+        mutual = (parent[other] == roots) & (roots < other)
+        parent[roots[mutual]] = roots[mutual]
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+        component = parent[component]
+
+    nb_horizontal = (width - 1) * height
+    right = np.zeros((width, height), dtype=bool)
+    up = np.zeros((width, height), dtype=bool)
+    right[:-1, :] = in_tree[:nb_horizontal].reshape(width - 1, height)
+    up[:, :-1] = in_tree[nb_horizontal:].reshape(width, height - 1)
+    return right, up
+
+def _maze_cycle_walk(nb_points, taille_grille, rng):
+    """
+    Chemin auto-évitant 2D de nb_points cases, sans retour en arrière : un labyrinthe (arbre couvrant
+    aléatoire) est tracé sur une grille de blocs 2 x 2, et le chemin longe ses murs. Ce contour est un cycle
+    hamiltonien de la grille fine, dont le successeur de chaque case se calcule en une fois ; il ne reste
+    qu'à le suivre depuis une case de départ aléatoire.
+    Le contour n'occupe que (2 * taille_grille)^2 cases et demande au moins 2 x 2 blocs : retourne None s'il
+    ne peut pas contenir nb_points cases.
+    """
+    if taille_grille < 2:
+        return None
+    width = height = max(2, int(np.ceil(np.sqrt(nb_points / 4))))
+    if width > taille_grille:
+        width = taille_grille
+        height = -(-nb_points // (4 * width))
+    if height > taille_grille:
+        return None
+    right, up = _random_spanning_tree(width, height, rng)
+    left = np.zeros_like(right)
+    left[1:, :] = right[:-1, :]
+    down = np.zeros_like(up)
+    down[:, 1:] = up[:, :-1]
+
+    # Parcours dans le sens trigonométrique : chaque quart de bloc longe un côté du bloc,
+    # ou passe dans le bloc voisin si le labyrinthe ouvre ce côté
+    x, z = np.meshgrid(np.arange(2 * width), np.arange(2 * height), indexing="ij")
+    qx, qz = x % 2, z % 2
+    i, j = x // 2, z // 2
+    bottom_left, bottom_right = (qx == 0) & (qz == 0), (qx == 1) & (qz == 0)
+    top_right, top_left = (qx == 1) & (qz == 1), (qx == 0) & (qz == 1)
+    dx = np.zeros_like(x)
+    dz = np.zeros_like(z)
+    open_side = np.where(bottom_left, down[i, j], np.where(bottom_right, right[i, j],
+                                                           np.where(top_right, up[i, j], left[i, j])))
+    dz[bottom_left] = -1
+    dx[bottom_right] = 1
+    dz[top_right] = 1
+    dx[top_left] = -1
+    # Côté fermé : on tourne dans le bloc au lieu de le traverser
+    closed = ~open_side
+    dx[closed & bottom_left], dz[closed & bottom_left] = 1, 0
+    dx[closed & bottom_right], dz[closed & bottom_right] = 0, 1
+    dx[closed & top_right], dz[closed & top_right] = -1, 0
+    dx[closed & top_left], dz[closed & top_left] = 0, -1
+    successor = ((x + dx) * (2 * height) + z + dz).ravel().tolist()
+
+    cell = int(rng.integers(len(successor)))
+    cycle = [cell]
+    for _ in range(nb_points - 1):
+        cell = successor[cell]
+        cycle.append(cell)
+    cycle = np.array(cycle, dtype=np.int64)
+    walk = np.zeros((nb_points, 3), dtype=np.int32)
+    walk[:, 0] = cycle // (2 * height) - width
+    walk[:, 2] = cycle % (2 * height) - height
+    return walk
+
+def _growth_walk(nb_points, taille_grille, activer_3d, rng, max_restarts):
+    """
+    Marche aléatoire par croissance : les cases visitées sont marquées dans une grille d'occupation entourée
+    d'une bordure occupée, ce qui évite tout test de limites ; à chaque pas seule une case voisine libre est
+    choisie. Dans une impasse, le chemin recule (la case reste marquée) ; si tout le chemin est défait ou si la
+    tentative dépasse 4 * nb_points tirages, la marche recommence depuis un nouveau départ.
+
+    :return: Tableau int32 (M, 3) de la plus longue tentative, M <= nb_points.
+    """
+    nb_segments = nb_points - 1
+    n = 2 * taille_grille + 3
+    ny = n if activer_3d else 3
+    # Indices à plat dans la grille (x, y, z) de forme (n, ny, n), bordure comprise
+    offsets = [ny * n, -ny * n, 1, -1]
+    if activer_3d:
+        offsets += [n, -n]
+    nb_directions = len(offsets)
+
+    best = []
+    for _ in range(max_restarts + 1):
+        occupied = bytearray(n * ny * n)
+        grid = np.frombuffer(occupied, dtype=np.uint8).reshape(n, ny, n)
+        grid[[0, -1]] = 1
+        grid[:, [0, -1]] = 1
+        grid[:, :, [0, -1]] = 1
+
+        start_x, start_z = rng.integers(-min(2, taille_grille), min(2, taille_grille) + 1, size=2)
+        position = ((start_x + taille_grille + 1) * ny + ny // 2) * n + start_z + taille_grille + 1
+        occupied[position] = 1
+        path = [position]
+        best_length, common, journal = 0, 0, []
+
+        budget = 4 * (nb_segments + 1)
+        while path and len(path) <= nb_segments and budget > 0:
+            budget -= min(1 << 16, nb_segments + 1 - len(path))
+            # Un tirage par pas : sa partie entière donne la direction, sa partie fractionnaire sert en cas de repli
+            for fraction in (rng.random(min(1 << 16, nb_segments + 1 - len(path))) * nb_directions).tolist():
+                candidate = position + offsets[int(fraction)]
+                if occupied[candidate]:
+                    # Direction occupée : tirage parmi les voisins libres seulement
+                    free = [position + offset for offset in offsets if not occupied[position + offset]]
+                    if not free:
+                        # Le plus long chemin vaut path[:common] + journal inversé : on ne copie rien ici
+                        if len(path) > best_length:
+                            best_length = common = len(path)
+                            journal = []
+                        if len(path) == common:
+                            journal.append(path[-1])
+                            common -= 1
+                        path.pop()
+                        if not path:
+                            break
+                        position = path[-1]
+                        continue
+                    candidate = free[int((fraction % 1) * len(free))]
+                occupied[candidate] = 1
+                path.append(candidate)
+                position = candidate
+
+        if len(path) < best_length:
+            path = path[:common] + journal[::-1]
+        if len(path) > len(best):
+            best = path
+        if len(best) > nb_segments:
+            break
+
+    x, y, z = np.unravel_index(np.array(best, dtype=np.int64), (n, ny, n))
+    offset = np.array([taille_grille + 1, ny // 2, taille_grille + 1])
+    return (np.stack([x, y, z], axis=1) - offset).astype(np.int32).reshape(-1, 3)
+
+def _serpentine_walk(nb_points, taille_grille, activer_3d, rng):
+    """
+    Chemin en serpentin qui balaie la grille rangée par rangée (puis couche par couche en 3D, une couche sur
+    deux parcourue à rebours) : il passe par toutes les cases, donc existe dès que la grille en contient
+    nb_points. Les axes sont retournés ou échangés au hasard.
+    """
+    side = 2 * taille_grille + 1
+    index = np.arange(nb_points, dtype=np.int64)
+    layer, cell = np.divmod(index, side * side)
+    cell = np.where(layer % 2 == 1, side * side - 1 - cell, cell)
+    row, column = np.divmod(cell, side)
+    column = np.where(row % 2 == 1, side - 1 - column, column)
+    walk = np.stack([row, layer, column], axis=1) - taille_grille
+    if not activer_3d:
+        walk[:, 1] = 0
+    if rng.random() < 0.5:
+        walk[:, [0, 2]] = walk[:, [2, 0]]
+    walk *= rng.choice([-1, 1], size=3)
+    return walk.astype(np.int32)
+
+def generate_self_avoiding_walk(nb_segments, taille_grille=15, activer_3d=False, seed=None, max_restarts=3):
+    """
+    Génère une marche auto-évitante sur la grille entière [-taille_grille, taille_grille]^3 (y = 0 en 2D).
+
+    En 2D, une marche aléatoire par croissance s'enferme vite dans ses propres boucles ; le chemin suit donc
+    les murs d'un labyrinthe aléatoire (_maze_cycle_walk), sans aucun retour en arrière, quand ce contour peut
+    le contenir. Sinon (petites grilles, et toujours en 3D) la marche se fait par croissance (_growth_walk) ;
+    si elle s'enferme malgré tout, ou si la grille 2D est grande et presque pleine, elle est balayée en
+    serpentin (_serpentine_walk).
+
+    :param nb_segments: Nombre de segments voulus.
+    :param taille_grille: Demi-taille de la grille.
+    :param activer_3d: Si True, permet un mouvement sur l'axe y.
+    :param seed: Graine (ou np.random.Generator) pour des résultats reproductibles.
+    :param max_restarts: Nombre maximal de nouveaux départs de la marche par croissance.
+    :return: Tableau int32 (nb_segments + 1, 3) des positions.
+    :raises ValueError: Si la grille a moins de nb_segments + 1 cases.
+    """
+    rng = np.random.default_rng(seed)
+    nb_points = nb_segments + 1
+    nb_cells = (2 * taille_grille + 1) ** (3 if activer_3d else 2)
+    if nb_points > nb_cells:
+        raise ValueError(f"La grille de demi-taille {taille_grille} n'a que {nb_cells} cases : "
+                         f"aucune marche auto-évitante de {nb_segments} segments")
+    if not activer_3d:
+        walk = _maze_cycle_walk(nb_points, taille_grille, rng)
+        if walk is not None:
+            return walk
+    # Hors contour, une grille 2D est presque pleine : la croissance n'y aboutit guère au-delà de quelques
+    # centaines de cases, on passe alors directement au serpentin
+    walk = np.empty((0, 3), dtype=np.int32)
+    if activer_3d or nb_cells <= 256:
+        walk = _growth_walk(nb_points, taille_grille, activer_3d, rng, max_restarts)
+    if len(walk) < nb_points:
+        walk = _serpentine_walk(nb_points, taille_grille, activer_3d, rng)
+    return walk
+
+def generate_maze_path(nb_segments, taille_grille=15, longueur_segment=1.0, activer_3d=False, seed=None):
     """
     Génère un chemin ressemblant à un labyrinthe dans une grille centrée autour de l'origine.
     Le chemin évite les auto-intersections et peut être généré en 2D ou en 3D.
@@ -23,38 +463,121 @@ def generate_maze_path(nb_segments, taille_grille=15, longueur_segment=1.0, acti
     :param taille_grille: Taille de la grille pour limiter les mouvements du chemin.
     :param longueur_segment: Longueur de chaque segment.
     :param activer_3d: Si True, permet un mouvement sur l'axe y pour un chemin en 3D.
+    :param seed: Graine pour des résultats reproductibles.
     :return: Liste de points Vector3 représentant le chemin du labyrinthe.
     """
-    # Commence à un point aléatoire près de l'origine
-    start_x = random.randint(-2, 2)
-    start_z = random.randint(-2, 2)
-    start_y = 0  # Commence au niveau du sol (y=0)
-    
-    points = [Vector3(start_x, start_y, start_z)]
-    points_visites = {(start_x, start_y, start_z)}
-    
-    # Directions : mouvement en 2D (x, z) ou en 3D (x, y, z)
-    directions = [(1, 0, 0), (-1, 0, 0), (0, 0, 1), (0, 0, -1)]
-    if activer_3d:
-        directions.extend([(0, 1, 0), (0, -1, 0)])  # Ajoute le mouvement sur l'axe y pour la 3D
-    
-    for _ in range(nb_segments):
-        # Choisir une direction aléatoire et calculer la nouvelle position
-        dx, dy, dz = random.choice(directions)
-        new_x = points[-1].x + dx * longueur_segment
-        new_y = points[-1].y + dy * longueur_segment
-        new_z = points[-1].z + dz * longueur_segment
-
-        # Vérifier que la nouvelle position est dans les limites et non revisitée
-        if (-taille_grille <= new_x <= taille_grille and 
-            -taille_grille <= new_y <= taille_grille and 
-            -taille_grille <= new_z <= taille_grille and
-            (new_x, new_y, new_z) not in points_visites):
-            
-            points.append(Vector3(new_x, new_y, new_z))
-            points_visites.add((new_x, new_y, new_z))
-    
-    return points
+    path = generate_self_avoiding_walk(nb_segments, taille_grille, activer_3d, seed) * longueur_segment
+    return [Vector3(*point) for point in path.tolist()]
+
+def segment_distances(p0, p1, q0, q1):
+    """
+    Distance minimale entre des paires de segments [p0, p1] et [q0, q1] (tableaux (N, 3)),
+    avec les paramètres s, t dans [0, 1] des points les plus proches (segments dégénérés compris).
+
+    :return: Tuple (distances (N,), s (N,), t (N,)).
+    """
+    d1, d2, r = p1 - p0, q1 - q0, p0 - q0
+    a = np.einsum("ij,ij->i", d1, d1)
+    e = np.einsum("ij,ij->i", d2, d2)
+    b = np.einsum("ij,ij->i", d1, d2)
+    c = np.einsum("ij,ij->i", d1, r)
+    f = np.einsum("ij,ij->i", d2, r)
+    eps = 1e-12
+    safe_a, safe_e = np.where(a > eps, a, 1.0), np.where(e > eps, e, 1.0)
+    denom = a * e - b * b
+
+    # Point le plus proche des droites, ramené sur le premier segment, puis sur le second
+    s = np.where(denom > eps * np.maximum(a * e, eps),
+                 np.clip((b * f - c * e) / np.where(denom > 0, denom, 1.0), 0.0, 1.0), 0.0)
+    t = (b * s + f) / safe_e
+    s = np.where(t < 0, np.clip(-c / safe_a, 0.0, 1.0), np.where(t > 1, np.clip((b - c) / safe_a, 0.0, 1.0), s))
+    t = np.clip(t, 0.0, 1.0)
+
+    # Segments réduits à un point
+    s = np.where(a <= eps, 0.0, s)
+    t = np.where(e <= eps, np.where(a <= eps, 0.0, t), np.where(a <= eps, np.clip(f / safe_e, 0.0, 1.0), t))
+    s = np.where((e <= eps) & (a > eps), np.clip(-c / safe_a, 0.0, 1.0), s)
+
+    gap = r + s[:, None] * d1 - t[:, None] * d2
+    return np.sqrt(np.einsum("ij,ij->i", gap, gap)), s, t
+
+def segment_proximity_pairs(starts, ends, threshold, cell_size=None, skip_adjacent=1, closed=False,
+                            chunk_size=1 << 20):
+    """
+    Trouve toutes les paires de segments (i < j) distantes de moins de threshold, sans test O(N²) :
+    les boîtes des segments, élargies de threshold / 2, sont rangées dans une grille uniforme et seules
+    les paires partageant une cellule sont testées. Une paire n'est gardée que dans la cellule contenant
+    le coin minimal de l'intersection de leurs boîtes, ce qui évite toute déduplication.
+
+    :param starts: Tableau (N, 3) des débuts de segments.
+    :param ends: Tableau (N, 3) des fins de segments.
+    :param threshold: Distance en dessous de laquelle deux segments sont en contact.
+    :param cell_size: Taille des cellules ; par défaut max(threshold, longueur moyenne des segments).
+    :param skip_adjacent: Les paires avec |i - j| <= skip_adjacent (voisins le long du chemin) sont ignorées.
+    :param closed: Chemin fermé : l'écart |i - j| se compte modulo N.
+    :param chunk_size: Nombre maximal de paires candidates traitées à la fois.
+    :return: Tuple (i, j, distances) trié par (i, j).
+    """
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    nb_segments = len(starts)
+    if cell_size is None:
+        cell_size = max(threshold, float(np.linalg.norm(ends - starts, axis=1).mean()) if nb_segments else 1.0)
+    box_min = np.minimum(starts, ends) - threshold / 2
+    box_max = np.maximum(starts, ends) + threshold / 2
+    origin = box_min.min(axis=0) if nb_segments else np.zeros(3)
+    low = np.floor((box_min - origin) / cell_size).astype(np.int64)
+    high = np.floor((box_max - origin) / cell_size).astype(np.int64)
+    dims = high.max(axis=0) + 1 if nb_segments else np.ones(3, dtype=np.int64)
+
+    # Une entrée (cellule, segment) par cellule couverte par la boîte de chaque segment
+    spans = high - low + 1
+    counts = spans.prod(axis=1)
+    segment = np.repeat(np.arange(nb_segments), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cells = low[segment] + np.stack([local // (spans[segment, 1] * spans[segment, 2]),
+                                     local // spans[segment, 2] % spans[segment, 1],
+                                     local % spans[segment, 2]], axis=1)
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    order = np.argsort(keys, kind="stable")
+    keys, segment, cells = keys[order], segment[order], cells[order]
+
+    # Chaque entrée est associée aux entrées qui la suivent dans la même cellule
+    cell_start = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    cell_count = np.diff(np.r_[cell_start, len(keys)])
+    position = np.arange(len(keys)) - np.repeat(cell_start, cell_count)
+    followers = np.repeat(cell_count, cell_count) - 1 - position
+    total = np.cumsum(followers)
+
+    found_i, found_j, found_d = [], [], []
+    first = 0
+    while first < len(keys):
+        last = max(int(np.searchsorted(total, (total[first - 1] if first else 0) + chunk_size, side="right")), first + 1)
+        n_after = followers[first:last]
+        a = np.repeat(np.arange(first, last), n_after)
+        b = a + 1 + np.arange(n_after.sum()) - np.repeat(np.cumsum(n_after) - n_after, n_after)
+        i, j = segment[a], segment[b]
+        i, j = np.minimum(i, j), np.maximum(i, j)
+
+        gap = j - i
+        if closed:
+            gap = np.minimum(gap, nb_segments - gap)
+        keep = gap > skip_adjacent
+        keep &= np.all(cells[a] == np.maximum(low[i], low[j]), axis=1)
+        keep &= np.all((box_min[i] <= box_max[j]) & (box_min[j] <= box_max[i]), axis=1)
+        i, j = i[keep], j[keep]
+        distances, _, _ = segment_distances(starts[i], ends[i], starts[j], ends[j])
+        close = distances < threshold
+        found_i.append(i[close])
+        found_j.append(j[close])
+        found_d.append(distances[close])
+        first = last
+
+    if not found_i:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    i, j, distances = np.concatenate(found_i), np.concatenate(found_j), np.concatenate(found_d)
+    order = np.lexsort((j, i))
+    return i[order], j[order], distances[order]
 
 def draw_vector_3(start, end, color, thickness=0.05):
     """Nous dessinons un vecteur en utilisant un cylindre et un cône."""
@@ -71,16 +594,127 @@ def draw_vector_3(start, end, color, thickness=0.05):
     pr.draw_cylinder_ex(start, end, thickness / 2, thickness / 2, 8, color)
     pr.draw_cylinder_ex(arrow_start, end, thickness * 2, thickness / 5, 8, color)
 
-def draw_points(points):
+def draw_points(points, max_points=200):
+    """Dessine les points (tableau (N, 3)) en sphères ; un long chemin n'en montre qu'au plus max_points, régulièrement espacés."""
     colors = [pr.RED, pr.GREEN, pr.BLUE]
-    for i, point in enumerate(points):
-        pr.draw_sphere(point, 0.1, colors[i % len(colors)])
+    stride = max(1, -(-len(points) // max_points))
+    for i, point in zip(range(0, len(points), stride), np.asarray(points)[::stride].tolist()):
+        pr.draw_sphere(Vector3(*point), 0.1, colors[i % len(colors)])
 
 def draw_vectors(points):
     for i in range(len(points) - 1):
         draw_vector_3(points[i], points[i + 1], pr.GRAY)
 
 
+def create_line_batch():
+    """
+    Lot de segments dessinés en un seul appel : un maillage raylib dynamique où chaque segment [a, b] est le
+    triangle plat (a, b, b), tracé en mode fil de fer. Le maillage est créé au premier remplissage (une fenêtre
+    doit être ouverte) et agrandi par doublement.
+    """
+    return {"mesh": None, "material": None, "capacity": 0, "count": 0}
+
+def fill_line_batch(batch, starts, ends):
+    """Remplace les segments du lot : les sommets float32 sont construits par numpy et envoyés au GPU en une copie."""
+    count = len(starts)
+    vertices = np.empty((count, 3, 3), dtype=np.float32)
+    vertices[:, 0] = starts
+    vertices[:, 1:] = np.asarray(ends)[:, None]
+    if count > batch["capacity"]:
+        if batch["mesh"] is not None:
+            pr.unload_mesh(batch["mesh"])
+        capacity = max(1024, 1 << (count - 1).bit_length())
+        mesh = pr.Mesh()
+        mesh.vertexCount = 3 * capacity
+        mesh.triangleCount = capacity
+        mesh.vertices = pr.ffi.cast("float *", pr.mem_alloc(9 * capacity * 4))
+        pr.upload_mesh(mesh, True)
+        batch["mesh"], batch["capacity"] = mesh, capacity
+        if batch["material"] is None:
+            batch["material"] = pr.load_material_default()
+    if count:
+        pr.update_mesh_buffer(batch["mesh"], 0, pr.ffi.cast("void *", pr.ffi.from_buffer(vertices)), vertices.nbytes, 0)
+    batch["count"] = count
+
+def draw_line_batch(batch, color):
+    """Dessine les segments du lot en un seul appel. À appeler dans begin_mode_3d."""
+    if batch["count"] == 0:
+        return
+    batch["mesh"].vertexCount = 3 * batch["count"]
+    batch["material"].maps[pr.MATERIAL_MAP_ALBEDO].color = color
+    # Les triangles plats n'ont pas d'orientation : l'élimination des faces arrière les supprimerait
+    pr.rl_disable_backface_culling()
+    pr.rl_enable_wire_mode()
+    pr.draw_mesh(batch["mesh"], batch["material"], pr.matrix_identity())
+    pr.rl_disable_wire_mode()
+    pr.rl_enable_backface_culling()
+
+def unload_line_batch(batch):
+    """Libère le maillage du lot."""
+    if batch["mesh"] is not None:
+        pr.unload_mesh(batch["mesh"])
+    batch.update(create_line_batch())
+
+_LINE_BATCH = create_line_batch()
+
+def draw_lines_3d(starts, ends, color, batch=None):
+    """
+    Dessine des segments (tableaux (N, 3)) qui changent d'une image à l'autre : ils remplissent un lot
+    (par défaut partagé) puis sont tracés en un seul appel. Des segments fixes gagnent à remplir leur propre
+    lot une fois (fill_line_batch) et à ne faire que draw_line_batch à chaque image. À appeler dans begin_mode_3d.
+    """
+    if len(starts) == 0:
+        return
+    batch = _LINE_BATCH if batch is None else batch
+    fill_line_batch(batch, starts, ends)
+    draw_line_batch(batch, color)
+
+def draw_path(camera, path, color=pr.GRAY, thickness=0.05, arrow_stride=1, min_tube_pixels=2.0, max_tubes=2000,
+              lines=None):
+    """
+    Dessine un chemin (tableau (N, 3)) : les segments dont le tube ferait moins de min_tube_pixels pixels
+    à l'écran sont tracés en lignes dans un seul lot, les plus proches en cylindres (au plus max_tubes, les
+    plus gros à l'écran). Une pointe de flèche est ajoutée tous les arrow_stride segments (0 pour aucune)
+    lorsqu'elle est visible. Pour un chemin fixe, lines est un lot (fill_line_batch) contenant déjà tous ses
+    segments : il est dessiné tel quel, les tubes recouvrant les lignes des segments proches.
+
+    :return: (nombre de segments en tube, nombre de segments en ligne).
+    """
+    path = np.asarray(path, dtype=np.float64).reshape(-1, 3)
+    if len(path) < 2:
+        return 0, 0
+    starts, ends = path[:-1], path[1:]
+
+    # Taille apparente du tube : pixels par unité à la profondeur du milieu de chaque segment
+    view = camera_view_matrix(camera)
+    projection = camera_projection_matrix(camera, pr.get_screen_width() / pr.get_screen_height())
+    pixels_per_unit = projection[1, 1] * pr.get_screen_height() / 2
+    depth = -((starts + ends) / 2 @ view[2, :3] + view[2, 3])
+    if camera.projection == pr.CAMERA_ORTHOGRAPHIC:
+        pixels = np.full(len(starts), thickness * pixels_per_unit)
+    else:
+        pixels = thickness * pixels_per_unit / np.maximum(depth, CAMERA_NEAR)
+    tube = (pixels >= min_tube_pixels) & (depth > 0)
+    if tube.sum() > max_tubes:
+        candidates = np.flatnonzero(tube)
+        tube[:] = False
+        tube[candidates[np.argpartition(-pixels[candidates], max_tubes - 1)[:max_tubes]]] = True
+
+    if lines is None:
+        draw_lines_3d(starts[~tube], ends[~tube], color)
+    else:
+        draw_line_batch(lines, color)
+    for start, end in zip(starts[tube].tolist(), ends[tube].tolist()):
+        pr.draw_cylinder_ex(Vector3(*start), Vector3(*end), thickness / 2, thickness / 2, 8, color)
+
+    if arrow_stride:
+        heads = np.arange(arrow_stride - 1, len(starts), arrow_stride)
+        heads = heads[(pixels[heads] * 4 >= min_tube_pixels) & (depth[heads] > 0)]
+        arrow_starts = starts[heads] + 0.8 * (ends[heads] - starts[heads])
+        for start, end in zip(arrow_starts.tolist(), ends[heads].tolist()):
+            pr.draw_cylinder_ex(Vector3(*start), Vector3(*end), thickness * 2, thickness / 5, 8, color)
+    return int(tube.sum()), int((~tube).sum())
+
 def draw_text_if_visible_3(camera, text, position_3d, font_size=20, color=pr.BLACK):
     """
     Affiche le texte à une position 2D projetée à partir d'une coordonnée 3D si elle est dans les limites de l'écran.
@@ -94,35 +728,91 @@ def draw_text_if_visible_3(camera, text, position_3d, font_size=20, color=pr.BLA
     text_position_2d = pr.get_world_to_screen(position_3d, camera)
     if 0 <= text_position_2d.x <= pr.get_screen_width() and 0 <= text_position_2d.y <= pr.get_screen_height():
         pr.draw_text(text, int(text_position_2d.x), int(text_position_2d.y), font_size, color)
-    else:
-        print("La position du texte est hors des limites de l'écran :", text_position_2d)
 
+def project_to_screen(camera, points, width, height):
+    """
+    Projette des points 3D à l'écran en une seule opération (même convention que pr.get_world_to_screen).
 
-def draw_scene(L,camera, grid_size, points, direction, turns):
+    :param points: Tableau (N, 3).
+    :return: (positions écran (N, 2), masque des points visibles : devant la caméra et dans l'écran).
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    view_projection = camera_view_projection_matrix(camera, width, height)
+    clip = points @ view_projection[:3, :3].T + view_projection[:3, 3]
+    w = points @ view_projection[3, :3] + view_projection[3, 3]
+    in_front = w > 1e-9
+    safe_w = np.where(in_front, w, 1.0)
+    screen = np.empty((len(points), 2))
+    screen[:, 0] = (clip[:, 0] / safe_w + 1) * 0.5 * width
+    screen[:, 1] = (1 - clip[:, 1] / safe_w) * 0.5 * height
+    visible = (in_front & (screen[:, 0] >= 0) & (screen[:, 0] <= width)
+               & (screen[:, 1] >= 0) & (screen[:, 1] <= height))
+    return screen, visible
+
+def declutter_labels(screen, candidates, cell_size):
+    """
+    Garde au plus une étiquette par case d'une grille en espace écran ; en cas de conflit la première
+    des candidates (ordre de priorité) l'emporte.
+
+    :param screen: Positions écran (N, 2).
+    :param candidates: Indices des étiquettes à considérer, par priorité décroissante.
+    :param cell_size: (largeur, hauteur) d'une case en pixels.
+    :return: Indices des étiquettes conservées, dans l'ordre de priorité.
+    """
+    candidates = np.asarray(candidates, dtype=np.int64)
+    cells = np.floor(screen[candidates] / np.asarray(cell_size, dtype=np.float64)).astype(np.int64)
+    keys = cells[:, 0] * (1 << 32) + cells[:, 1]
+    _, first = np.unique(keys, return_index=True)
+    return candidates[np.sort(first)]
+
+def draw_labels_3d(camera, labels, positions, font_size=10, color=pr.BLACK, cell_size=None):
+    """
+    Affiche des étiquettes ancrées en 3D : projection vectorisée, élimination silencieuse des étiquettes
+    hors écran ou derrière la caméra, puis désencombrement par grille. À appeler hors de begin_mode_3d.
+
+    :param labels: Liste de textes ou fonction indice -> texte (formatée seulement pour les étiquettes dessinées).
+    :param positions: Tableau (N, 3) des ancres.
+    :param cell_size: (largeur, hauteur) des cases de désencombrement ; par défaut d'après la taille de police.
+    :return: Nombre d'étiquettes dessinées.
+    """
+    width, height = pr.get_screen_width(), pr.get_screen_height()
+    screen, visible = project_to_screen(camera, positions, width, height)
+    if cell_size is None:
+        cell_size = (font_size * 6, font_size * 1.5)
+    kept = declutter_labels(screen, np.flatnonzero(visible), cell_size)
+    label = labels if callable(labels) else labels.__getitem__
+    for i, (x, y) in zip(kept.tolist(), screen[kept].tolist()):
+        pr.draw_text(label(i), int(x), int(y), font_size, color)
+    return len(kept)
+
+
+def draw_scene(camera, grid_size, path, cross_y, codes, contacts=None, lines=None):
     """
     Affiche les éléments de la scène : axes, points, vecteurs et directions de rotation.
+    path est le chemin converti une fois pour toutes en tableau (N, 3), lines le lot de ses segments.
+    Les libellés de la liste ne sont formatés que pour les lignes qui tiennent à l'écran.
+    contacts, s'il est donné, est un couple de tableaux (K, 3) reliant les points les plus proches
+    des segments trop proches, tracés en rouge.
     """
     pr.begin_drawing()
     pr.clear_background(pr.RAYWHITE)
     pr.begin_mode_3d(camera)
     
     pr.draw_grid(grid_size, 1)  # Dessine une grille pour référence
-    draw_points(points)        # Dessine les points
-    draw_vectors(points)       # Dessine les vecteurs
-
-    # Affiche les directions de rotation
-    for i, turn in enumerate(turns):
-        if i + 1 < len(points):
-            midpoint = Vector3(
-                (points[i].x + points[i + 1].x) / 2,
-                (points[i].y + points[i + 1].y) / 2,
-                (points[i].z + points[i + 1].z) / 2,
-            )
-            draw_text_if_visible_3(camera, turn, midpoint, font_size=10, color=pr.BLACK)
+    draw_points(path)        # Dessine les points
+    draw_path(camera, path, pr.GRAY, arrow_stride=max(1, len(path) // 200), lines=lines)  # Dessine les vecteurs
+    if contacts is not None and len(contacts[0]):
+        draw_lines_3d(contacts[0], contacts[1], pr.RED)
 
     pr.end_mode_3d()
+
+    # Affiche les directions de rotation au milieu des segments
+    midpoints = (path[:-1] + path[1:])[:len(codes)] / 2
+    draw_labels_3d(camera, lambda i: TURN_LABELS[int(codes[i])], midpoints, font_size=10, color=pr.BLACK)
+
     decalage=10
-    for line in L:
+    nb_lignes = max(0, (pr.get_screen_height() - decalage) // 22)
+    for line in format_turns(cross_y, codes, range(min(nb_lignes, len(codes)))):
         pr.draw_text(line, 60, decalage, 10, pr.BLACK)
         decalage += 22
     pr.end_drawing()
@@ -163,17 +853,85 @@ def check_turn_direction(a, b, c):
     
     XAB_BC = cross_product(AB, BC)
 
-    if XAB_BC.y > 0:
-        print("AntiHoraire")
-        return XAB_BC, "AntiHoraire"
-    elif XAB_BC.y < 0:
-        print("Horaire")
-        return XAB_BC, "Horaire"
-        
-    else:
-        print("collineaire§")
+    # Le signe vient du prédicat robuste : un produit presque nul dû aux arrondis n'est pas un virage
+    _, codes, _ = orient_turns([a, b, c])
+    return XAB_BC, TURN_LABELS[int(codes[0])]
+
+# Libellés des codes de virage retournés par classify_turns
+TURN_LABELS = {1: "AntiHoraire", -1: "Horaire", 0: "colineaire"}
 
-        return XAB_BC, "colineaire"
+# Borne d'erreur relative du déterminant d'orientation calculé en flottants (ccwerrboundA de Shewchuk)
+_ORIENT_EPSILON = np.finfo(np.float64).eps / 2
+_ORIENT_ERRBOUND = (3 + 16 * _ORIENT_EPSILON) * _ORIENT_EPSILON
+
+def orient_turns(path):
+    """
+    Prédicat d'orientation robuste pour tous les virages d'un chemin (signe de la composante y du produit
+    vectoriel des segments consécutifs). Le déterminant est calculé en flottants et son signe n'est gardé
+    que s'il dépasse la borne d'erreur ; les rares cas ambigus sont recalculés exactement, en entiers
+    si les coordonnées sont entières, sinon en rationnels (Fraction). Un chemin à coordonnées entières
+    est traité directement en entiers.
+
+    :param path: Tableau (N, 3) ou liste de Vector3.
+    :return: (déterminants (N-2,), codes int8 : 1 AntiHoraire, -1 Horaire, 0 colinéaire,
+             statistiques {"tested", "exact_integer", "exact_rational"}).
+    """
+    if not isinstance(path, np.ndarray):
+        path = np.array([[p.x, p.y, p.z] for p in path], dtype=np.float64)
+    path = path.reshape(-1, 3)
+    stats = {"tested": max(len(path) - 2, 0), "exact_integer": 0, "exact_rational": 0}
+    if len(path) < 3:
+        return np.empty(0), np.empty(0, dtype=np.int8), stats
+
+    # Le virage autour de y est l'orientation des points dans le plan (u, v) = (z, x)
+    if np.issubdtype(path.dtype, np.integer):
+        u, v = path[:, 2].astype(np.int64), path[:, 0].astype(np.int64)
+        det = (u[:-2] - u[2:]) * (v[1:-1] - v[2:]) - (v[:-2] - v[2:]) * (u[1:-1] - u[2:])
+        return det.astype(np.float64), np.sign(det).astype(np.int8), stats
+
+    path = path.astype(np.float64, copy=False)
+    u, v = path[:, 2], path[:, 0]
+    det_left = (u[:-2] - u[2:]) * (v[1:-1] - v[2:])
+    det_right = (v[:-2] - v[2:]) * (u[1:-1] - u[2:])
+    det = det_left - det_right
+    errbound = _ORIENT_ERRBOUND * (np.abs(det_left) + np.abs(det_right))
+    codes = np.sign(det).astype(np.int8)
+
+    # Une borne nulle signifie deux produits exactement nuls, donc un déterminant exactement nul
+    ambiguous = np.flatnonzero((np.abs(det) <= errbound) & (errbound > 0))
+    if len(ambiguous):
+        triples = np.stack([path[ambiguous], path[ambiguous + 1], path[ambiguous + 2]], axis=1)[:, :, [2, 0]]
+        integral = np.all((triples == np.round(triples)) & (np.abs(triples) < 2 ** 30), axis=(1, 2))
+
+        entiers = triples[integral].astype(np.int64)
+        det_exact = ((entiers[:, 0, 0] - entiers[:, 2, 0]) * (entiers[:, 1, 1] - entiers[:, 2, 1])
+                     - (entiers[:, 0, 1] - entiers[:, 2, 1]) * (entiers[:, 1, 0] - entiers[:, 2, 0]))
+        det[ambiguous[integral]] = det_exact
+        codes[ambiguous[integral]] = np.sign(det_exact)
+
+        for i, (a, b, c) in zip(ambiguous[~integral].tolist(), triples[~integral].tolist()):
+            (au, av), (bu, bv), (cu, cv) = ((Fraction(x), Fraction(y)) for x, y in (a, b, c))
+            exact = (au - cu) * (bv - cv) - (av - cv) * (bu - cu)
+            det[i] = float(exact)
+            codes[i] = (exact > 0) - (exact < 0)
+
+        stats["exact_integer"] = int(integral.sum())
+        stats["exact_rational"] = len(ambiguous) - stats["exact_integer"]
+    return det, codes, stats
+
+def classify_turns(path):
+    """
+    Classe tous les virages d'un chemin en une passe (voir orient_turns).
+
+    :param path: Tableau (N, 3) ou liste de Vector3.
+    :return: (composantes y des produits vectoriels, tableau (N-2,) ; codes int8 : 1 AntiHoraire, -1 Horaire, 0 colinéaire).
+    """
+    cross_y, codes, _ = orient_turns(path)
+    return cross_y, codes
+
+def format_turns(cross_y, codes, indices):
+    """Formate les libellés des virages demandés seulement (le virage i a lieu au point i + 1)."""
+    return [f"pont n°{i + 1}: {TURN_LABELS[codes[i]]} (val de y ={cross_y[i]:.2f})" for i in indices]
 
 def update_camera_position(camera, movement_speed):
     """Met à jour la position de la caméra en fonction des touches pressées."""
@@ -193,23 +951,15 @@ def check_turn_directions_for_maze(points):
     """
     Vérifie les directions de rotation pour chaque trio consécutif de points dans le labyrinthe.
     
-    :param points: Liste de points Vector3 représentant le chemin du labyrinthe.
+    :param points: Liste de points Vector3 ou tableau (N, 3) représentant le chemin du labyrinthe.
     :return: Liste des directions de rotation pour chaque trio de points.
     """
-    directions = []
-    for i in range(len(points) - 2):
-        a = points[i]
-        b = points[i + 1]
-        c = points[i + 2]
-        _, turn = check_turn_direction(a, b, c)
-        directions.append(turn)
-    return directions
+    _, codes = classify_turns(points)
+    return [TURN_LABELS[code] for code in codes.tolist()]
+
 def control_maze_turns(points):
-    results = []
-    for i in range(1, len(points) - 1):
-        cross_vector, turn = check_turn_direction(points[i - 1], points[i], points[i + 1])
-        results.append(f"pont n°{i}: {turn} (val de y ={cross_vector.y:.2f})")
-    return results
+    cross_y, codes = classify_turns(points)
+    return format_turns(cross_y, codes, range(len(codes)))
 
 def main():
     pr.init_window(800, 600, "Produit Vectoriel pour la Direction de Rotation")
@@ -221,15 +971,23 @@ def main():
 
     # Génère des points pour la spirale en zigzag
     points = generate_maze_path(20, int(grid_size / 2), 1.0, True)
-    list = control_maze_turns(points)
-
-    # Vérifie les directions de rotation pour chaque trio de points
-    turns = check_turn_directions_for_maze(points)
+    # Classe tous les virages du chemin une seule fois
+    cross_y, codes = classify_turns(points)
+    # Segments non voisins passant à moins d'une demi-case l'un de l'autre
+    path = np.array([[p.x, p.y, p.z] for p in points])
+    i, j, _ = segment_proximity_pairs(path[:-1], path[1:], 0.5)
+    _, s, t = segment_distances(path[i], path[i + 1], path[j], path[j + 1])
+    contacts = (path[i] + s[:, None] * (path[i + 1] - path[i]), path[j] + t[:, None] * (path[j + 1] - path[j]))
+
+    # Le chemin est fixe : ses segments sont envoyés au GPU une seule fois
+    path_lines = create_line_batch()
+    fill_line_batch(path_lines, path[:-1], path[1:])
 
     while not pr.window_should_close():
         update_camera_position(camera, movement_speed)
-        draw_scene(list,camera, grid_size, points, None, turns)
+        draw_scene(camera, grid_size, path, cross_y, codes, contacts, path_lines)
         
+    unload_line_batch(path_lines)
     pr.close_window()
 
 # Lancer le programme principal
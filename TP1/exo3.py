@@ -1,7 +1,12 @@
 import pyray as pr
 import math
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from pyray import Vector3
 
+from TP1.exo1_2 import morton_codes
+
 
 def initialize_camera():
     """Initialise la caméra 3D."""
@@ -94,10 +99,286 @@ def is_point_in_fov(fov_position, fov_direction, fov_distance, fov_angle, point)
     cos_moitier_fov = math.cos(math.radians(fov_angle) / 2)
     return dot >= cos_moitier_fov
 
+def prepare_fov_cones(directions, angles):
+    """
+    Précalcule, pour un ou plusieurs cônes, la direction normalisée et le seuil cos(angle/2).
+
+    :param directions: Tableau (M, 3) ou (3,) des directions de vue.
+    :param angles: Angles d'ouverture en degrés (M,) ou scalaire.
+    :return: (directions normalisées, cosinus des demi-angles).
+    """
+    directions = np.asarray(directions, dtype=np.float64)
+    directions = directions / np.linalg.norm(directions, axis=-1, keepdims=True)
+    cos_half_angles = np.cos(np.radians(np.asarray(angles, dtype=np.float64)) / 2)
+    return directions, cos_half_angles
+
+def fov_mask(points, fov_position, unit_direction, fov_distance, cos_half_angle):
+    """
+    Version vectorisée de is_point_in_fov : teste tous les points (N, 3) contre un cône
+    dont la direction est déjà normalisée et le seuil cos(angle/2) déjà calculé.
+    """
+    diff = points - fov_position
+    distance_sq = np.einsum("ij,ij->i", diff, diff)
+    dot = diff @ unit_direction
+    return (distance_sq <= fov_distance ** 2) & (dot >= cos_half_angle * np.sqrt(distance_sq))
+
+def fov_bounding_sphere(fov_position, unit_direction, fov_distance, fov_angle):
+    """
+    Calcule la plus petite sphère englobant le secteur sphérique du champ de vision.
+    Fonctionne pour un cône ou pour M cônes à la fois (positions et directions (M, 3)).
+    """
+    half_angle = np.radians(fov_angle) / 2
+    cos_half, sin_half = np.cos(half_angle), np.sin(half_angle)
+    narrow = half_angle <= np.pi / 4
+    wide = half_angle >= np.pi / 2
+    with np.errstate(divide="ignore"):
+        narrow_radius = fov_distance / (2 * cos_half)
+    offset = np.where(narrow, narrow_radius, np.where(wide, 0.0, fov_distance * cos_half))
+    radius = np.where(narrow, narrow_radius, np.where(wide, fov_distance, fov_distance * sin_half))
+    center = np.asarray(fov_position, dtype=np.float64) + unit_direction * np.expand_dims(offset, -1)
+    return center, radius
+
+def build_spatial_hash(points, cell_size):
+    """
+    Construit une grille uniforme sur un grand nuage de points : les points sont triés par cellule
+    et chaque cellule non vide est décrite par sa clé, son début et son nombre de points.
+
+    :param points: Tableau (N, 3) des points.
+    :param cell_size: Taille d'une cellule de la grille.
+    :return: Dictionnaire décrivant la grille.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    cells = np.floor(points / cell_size).astype(np.int64)
+    cell_min = cells.min(axis=0)
+    dims = cells.max(axis=0) - cell_min + 1
+    cells -= cell_min
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+
+    order = np.argsort(keys, kind="stable")
+    unique_keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+    return {
+        "points": points[order],
+        "indices": order,
+        "cell_size": cell_size,
+        "cell_min": cell_min,
+        "dims": dims,
+        "keys": unique_keys,
+        "starts": starts,
+        "counts": counts,
+    }
+
+def _spatial_hash_candidates(grid, center, radius):
+    """Retourne les positions (dans l'ordre trié de la grille) des points des cellules touchant la sphère."""
+    cell_size = grid["cell_size"]
+    low = np.maximum(np.floor((center - radius) / cell_size).astype(np.int64) - grid["cell_min"], 0)
+    high = np.minimum(np.floor((center + radius) / cell_size).astype(np.int64) - grid["cell_min"], grid["dims"] - 1)
+    if np.any(high < low):
+        return np.empty(0, dtype=np.int64)
+
+    ix, iy, iz = np.meshgrid(*(np.arange(low[a], high[a] + 1) for a in range(3)), indexing="ij")
+    cells = np.stack([ix.ravel(), iy.ravel(), iz.ravel()], axis=1)
+
+    # Rejeter les cellules dont la boîte ne touche pas la sphère englobante du cône
+    box_min = (cells + grid["cell_min"]) * cell_size
+    closest = np.clip(center, box_min, box_min + cell_size)
+    cells = cells[np.einsum("ij,ij->i", closest - center, closest - center) <= radius ** 2]
+
+    dims = grid["dims"]
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    slots = np.searchsorted(grid["keys"], keys)
+    found = slots < len(grid["keys"])
+    found[found] = grid["keys"][slots[found]] == keys[found]
+    slots = slots[found]
+    if len(slots) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    starts = grid["starts"][slots]
+    counts = grid["counts"][slots]
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + offsets
+
+def query_spatial_hash_fov(grid, fov_position, fov_direction, fov_distance, fov_angle):
+    """
+    Retourne les indices (dans le nuage d'origine) des points situés dans le champ de vision.
+    Seules les cellules touchant la sphère englobante du cône sont testées.
+    """
+    fov_position = np.asarray(fov_position, dtype=np.float64)
+    unit_direction, cos_half_angle = prepare_fov_cones(fov_direction, fov_angle)
+    center, radius = fov_bounding_sphere(fov_position, unit_direction, fov_distance, fov_angle)
+
+    candidates = _spatial_hash_candidates(grid, center, radius)
+    inside = fov_mask(grid["points"][candidates], fov_position, unit_direction, fov_distance, cos_half_angle)
+    return grid["indices"][candidates[inside]]
+
+def query_spatial_hash_fov_batch(grid, fov_positions, fov_directions, fov_distances, fov_angles, max_workers=None):
+    """
+    Interroge la grille pour plusieurs observateurs à la fois, en parallèle sur un pool de threads
+    (les noyaux numpy relâchent le GIL).
+
+    :return: Liste des tableaux d'indices visibles, un par observateur.
+    """
+    fov_positions = np.asarray(fov_positions, dtype=np.float64)
+    fov_directions = np.asarray(fov_directions, dtype=np.float64)
+    fov_distances = np.broadcast_to(fov_distances, len(fov_positions))
+    fov_angles = np.broadcast_to(fov_angles, len(fov_positions))
+
+    def query(i):
+        return query_spatial_hash_fov(grid, fov_positions[i], fov_directions[i], fov_distances[i], fov_angles[i])
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(query, range(len(fov_positions))))
+
+def _visibility_hits(fov_positions, fov_directions, fov_distances, fov_angles, points, memory_budget, max_workers,
+                     consume):
+    """
+    Parcourt les paires (cône, point) visibles par blocs de points. Pour chaque bloc, consume(cones, indices)
+    reçoit les paires du bloc, triées par cône, depuis le thread qui l'a calculé ; rien n'est conservé d'un bloc
+    à l'autre, la mémoire reste donc bornée par memory_budget quel que soit le nombre de paires visibles.
+    Les points sont d'abord triés selon l'ordre de Morton pour que chaque bloc soit compact dans l'espace :
+    les cônes dont la sphère englobante ne touche pas la boîte du bloc sont ignorés.
+
+    Distance et produit scalaire sont obtenus par produits matriciels, sur des tableaux (cônes actifs, bloc) :
+    |p - c|^2 = |p|^2 - 2 p.c + |c|^2 et (p - c).d = p.d - c.d.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    fov_positions = np.asarray(fov_positions, dtype=np.float64)
+    nb_cones, nb_points = len(fov_positions), len(points)
+    if nb_cones == 0 or nb_points == 0:
+        return
+    fov_distances = np.broadcast_to(np.asarray(fov_distances, dtype=np.float64), (nb_cones,))
+    fov_angles = np.broadcast_to(np.asarray(fov_angles, dtype=np.float64), (nb_cones,))
+    unit_directions, cos_half_angles = prepare_fov_cones(fov_directions, fov_angles)
+    cos_half_angles = np.broadcast_to(cos_half_angles, (nb_cones,))
+
+    # Recentrer pour limiter l'annulation numérique dans le développement de |p - c|^2
+    center = points.mean(axis=0)
+    order = np.argsort(morton_codes(points), kind="stable")
+    sorted_points = points[order] - center
+    positions = fov_positions - center
+    sphere_centers, sphere_radii = fov_bounding_sphere(positions, unit_directions, fov_distances, fov_angles)
+    positions_sq = np.einsum("ij,ij->i", positions, positions)
+    positions_dot_directions = np.einsum("ij,ij->i", positions, unit_directions)
+    distances_sq = fov_distances ** 2
+
+    # Par thread : quatre tableaux temporaires (M, bloc) de float64, puis au pire autant de paires visibles
+    # que de cases, chacune décrite par quelques entiers le temps d'être transmise à consume
+    chunk_size = max(8, memory_budget // (64 * nb_cones))
+
+    def process_chunk(start):
+        chunk = sorted_points[start:start + chunk_size]
+        closest = np.clip(sphere_centers, chunk.min(axis=0), chunk.max(axis=0))
+        gap = closest - sphere_centers
+        cones = np.flatnonzero(np.einsum("ij,ij->i", gap, gap) <= sphere_radii ** 2)
+        if len(cones) == 0:
+            return
+
+        distance_sq = positions[cones] @ chunk.T
+        distance_sq *= -2
+        distance_sq += np.einsum("ij,ij->i", chunk, chunk)
+        distance_sq += positions_sq[cones, None]
+        np.maximum(distance_sq, 0, out=distance_sq)
+
+        dot = unit_directions[cones] @ chunk.T
+        dot -= positions_dot_directions[cones, None]
+
+        visible = distance_sq <= distances_sq[cones, None]
+        np.sqrt(distance_sq, out=distance_sq)
+        distance_sq *= cos_half_angles[cones, None]
+        visible &= dot >= distance_sq
+
+        rows, cols = np.nonzero(visible)
+        del distance_sq, dot, visible
+        consume(cones[rows], order[start + cols])
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for _ in executor.map(process_chunk, range(0, nb_points, chunk_size)):
+            pass
+
+def compute_visibility_bitset(fov_positions, fov_directions, fov_distances, fov_angles, points,
+                              memory_budget=64 * 2**20, max_workers=None):
+    """
+    Calcule la relation de visibilité complète entre M cônes et N points sous forme de bitset.
+    Les points sont traités par blocs dont la taille est bornée par memory_budget (octets par thread),
+    répartis sur un pool de threads ; une matrice M x N de flottants n'est jamais construite.
+
+    :return: Tableau uint8 (M, ceil(N / 8)) ; le bit j (ordre 'little') de la ligne i indique si le point j est vu par le cône i.
+    """
+    nb_cones, nb_points = len(fov_positions), len(points)
+    row_bytes = (nb_points + 7) // 8
+    bits = np.zeros((nb_cones, row_bytes), dtype=np.uint8)
+    flat_bits = bits.reshape(-1)
+    # Deux blocs peuvent toucher le même octet : les écritures sont sérialisées
+    lock = threading.Lock()
+
+    def consume(cones, indices):
+        positions = cones * row_bytes + (indices >> 3)
+        masks = (1 << (indices & 7)).astype(np.uint8)
+        with lock:
+            np.bitwise_or.at(flat_bits, positions, masks)
+
+    _visibility_hits(fov_positions, fov_directions, fov_distances, fov_angles, points, memory_budget, max_workers,
+                     consume)
+    return bits
+
+def compute_visibility_sparse(fov_positions, fov_directions, fov_distances, fov_angles, points,
+                              memory_budget=64 * 2**20, max_workers=None):
+    """
+    Même calcul que compute_visibility_bitset, retourné sous forme de matrice creuse au format CSR.
+
+    :return: (indptr, indices) : les points vus par le cône i sont indices[indptr[i]:indptr[i + 1]], triés.
+    """
+    nb_cones, nb_points = len(fov_positions), len(points)
+    index_dtype = np.int32 if nb_points <= np.iinfo(np.int32).max else np.int64
+    # Chaque bloc ne garde que ses lignes CSR : cônes présents, nombre de points par cône, indices compacts
+    blocks = []
+
+    def consume(cones, indices):
+        present, sizes = np.unique(cones, return_counts=True)
+        blocks.append((present, sizes, indices.astype(index_dtype)))
+
+    _visibility_hits(fov_positions, fov_directions, fov_distances, fov_angles, points, memory_budget, max_workers,
+                     consume)
+    counts = np.zeros(nb_cones, dtype=np.int64)
+    for present, sizes, _ in blocks:
+        counts[present] += sizes
+    indptr = np.zeros(nb_cones + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+
+    # Recopie bloc par bloc à la suite de chaque ligne, puis tri de chaque ligne sur place
+    indices = np.empty(indptr[-1], dtype=np.int64)
+    cursor = indptr[:-1].copy()
+    while blocks:
+        present, sizes, block_indices = blocks.pop()
+        shift = np.repeat(cursor[present] - (np.cumsum(sizes) - sizes), sizes)
+        indices[shift + np.arange(len(block_indices))] = block_indices
+        cursor[present] += sizes
+    for i in range(nb_cones):
+        indices[indptr[i]:indptr[i + 1]].sort()
+    return indptr, indices
+
+def visibility_bitset_to_sparse(bits, nb_points, rows_per_block=64):
+    """
+    Convertit un bitset de visibilité en matrice creuse au format CSR, par blocs de lignes.
+
+    :return: (indptr, indices) : les points vus par le cône i sont indices[indptr[i]:indptr[i + 1]].
+    """
+    indptr = np.zeros(len(bits) + 1, dtype=np.int64)
+    indices = []
+    for start in range(0, len(bits), rows_per_block):
+        block = np.unpackbits(bits[start:start + rows_per_block], axis=1, count=nb_points, bitorder="little")
+        rows, cols = np.nonzero(block)
+        indptr[start + 1:start + 1 + len(block)] = np.bincount(rows, minlength=len(block))
+        indices.append(cols)
+    np.cumsum(indptr, out=indptr)
+    return indptr, np.concatenate(indices) if indices else np.empty(0, dtype=np.int64)
+
 def draw_points(points, fov_position, fov_direction, fov_distance, fov_angle):
     """Dessine les points, avec une couleur verte s'ils sont dans le champ de vision (FOV)."""
-    for point in points:
-        if is_point_in_fov(fov_position, fov_direction, fov_distance, fov_angle, point):
+    coords = np.array([[p.x, p.y, p.z] for p in points])
+    unit_direction, cos_half_angle = prepare_fov_cones([fov_direction.x, fov_direction.y, fov_direction.z], fov_angle)
+    inside = fov_mask(coords, [fov_position.x, fov_position.y, fov_position.z], unit_direction, fov_distance, cos_half_angle)
+    for point, visible in zip(points, inside):
+        if visible:
             pr.draw_sphere(point, 0.1, pr.GREEN)
         else:
             pr.draw_sphere(point, 0.1, pr.RED)
@@ -1,8 +1,11 @@
 import pyray as pr
 import math
+import numpy as np
 from pyray import Vector3
 import trimesh
 
+from TP1.exo1_2 import screen_to_world_ray, morton_codes, camera_frustum_planes, cull_mesh, build_cull_index, spheres_in_frustum, record_culling, new_cull_stats
+
 def initialize_camera():
     """Initialise la caméra 3D."""
     camera = pr.Camera3D(
@@ -111,10 +114,14 @@ def compute_face_normals(mesh):
     return normals
 
 
-def draw_vertex_normals(mesh, vertex_normals):
+def draw_vertex_normals(mesh, vertex_normals, frustum=None, stats=None):
     """
     Dessine les normales des sommets comme des vecteurs à partir de chaque sommet.
     """
+    if frustum is not None:
+        visible = spheres_in_frustum(frustum, mesh.vertices, 0.5)
+        record_culling(stats, visible)
+        vertex_normals = {i: vertex_normals[i] for i in np.flatnonzero(visible)}
     for vertex_index, normal in vertex_normals.items():
         start_point = Vector3(*mesh.vertices[vertex_index])
         end_point = Vector3(
@@ -143,27 +150,43 @@ def draw_edge(start, end, color, thickness=0.05):
     """Dessine une arête comme un cylindre."""
     pr.draw_cylinder_ex(start, end, thickness / 2, thickness / 2, 8, color)
 
-def draw_mesh(mesh):
-    """Dessine le mesh complet avec sommets, arêtes et faces."""
+def draw_mesh(mesh, frustum=None, stats=None, cull_index=None):
+    """
+    Dessine le mesh complet avec sommets, arêtes et faces.
+    Si les plans du frustum sont fournis, seuls les blocs de faces, arêtes et sommets visibles sont dessinés ;
+    cull_index (build_cull_index) évite de recalculer les boîtes d'un mesh statique à chaque image.
+    """
+    if frustum is None:
+        faces, edges, vertices = mesh.faces, mesh.edges, mesh.vertices
+    else:
+        face_ids, edge_ids, vertex_ids = cull_mesh(frustum, mesh.vertices, mesh.faces, mesh.edges, 0.05, stats=stats,
+                                                   index=cull_index)
+        faces, edges, vertices = mesh.faces[face_ids], mesh.edges[edge_ids], mesh.vertices[vertex_ids]
+
     # Dessine les faces sous forme de triangles
-    for face in mesh.faces:
+    for face in faces:
         v0 = Vector3(*mesh.vertices[face[0]])
         v1 = Vector3(*mesh.vertices[face[1]])
         v2 = Vector3(*mesh.vertices[face[2]])
         pr.draw_triangle_3d(v0, v1, v2, pr.LIGHTGRAY)  # Dessine la face comme un triangle rempli
     
     # Dessine les arêtes
-    for edge in mesh.edges:
+    for edge in edges:
         v_start = Vector3(*mesh.vertices[edge[0]])
         v_end = Vector3(*mesh.vertices[edge[1]])
         draw_edge(v_start, v_end, pr.BLACK)  # Dessine l'arête
     
     # Dessine les sommets
-    for vertex in mesh.vertices:
+    for vertex in vertices:
         pr.draw_sphere(Vector3(*vertex), 0.05, pr.RED)  # Dessine les sommets comme de petites sphères
 
-def draw_face_normals(face_normals):
+def draw_face_normals(face_normals, frustum=None, stats=None):
     """Dessine les normales des faces comme des vecteurs à partir du centre de chaque face."""
+    if frustum is not None:
+        centers = np.array([[center.x, center.y, center.z] for center, _ in face_normals])
+        visible = spheres_in_frustum(frustum, centers, 0.5)
+        record_culling(stats, visible)
+        face_normals = [face_normals[i] for i in np.flatnonzero(visible)]
     for center, normal in face_normals:
         end_point = Vector3(
             center.x + normal.x * 0.5,  # Échelle de la normale pour la visualisation
@@ -172,6 +195,141 @@ def draw_face_normals(face_normals):
         )
         draw_vector_3(center, end_point, pr.BLUE)  # Dessine le vecteur normal
 
+
+def build_triangle_index(vertices, faces, leaf_size=256):
+    """
+    Construit un index spatial pour le picking : les triangles sont triés selon l'ordre de Morton
+    de leur centre puis regroupés en feuilles de leaf_size triangles, chacune avec sa boîte englobante.
+    Les arêtes e1 et e2 de Möller–Trumbore sont précalculées une seule fois.
+
+    :param vertices: Tableau (V, 3) des sommets.
+    :param faces: Tableau (F, 3) des indices de sommets de chaque face.
+    :param leaf_size: Nombre de triangles par feuille.
+    :return: Dictionnaire décrivant l'index.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces)
+    triangles = vertices[faces]
+
+    order = np.argsort(morton_codes(triangles.mean(axis=1)), kind="stable")
+    triangles = triangles[order]
+
+    starts = np.arange(0, len(order), leaf_size)
+    leaf_min = np.minimum.reduceat(triangles.min(axis=1), starts, axis=0)
+    leaf_max = np.maximum.reduceat(triangles.max(axis=1), starts, axis=0)
+
+    return {
+        "face_ids": order,
+        "v0": triangles[:, 0],
+        "e1": triangles[:, 1] - triangles[:, 0],
+        "e2": triangles[:, 2] - triangles[:, 0],
+        "leaf_size": leaf_size,
+        "leaf_min": leaf_min,
+        "leaf_max": leaf_max,
+    }
+
+
+def ray_triangles_intersect(origin, direction, v0, e1, e2, epsilon=1e-9):
+    """
+    Teste un rayon contre un ensemble de triangles avec l'algorithme de Möller–Trumbore vectorisé.
+
+    :return: (t, u, v) tableaux de taille K ; t vaut inf lorsque le triangle n'est pas touché.
+    """
+    pvec = np.cross(direction, e2)
+    det = np.einsum("ij,ij->i", e1, pvec)
+    valid = np.abs(det) > epsilon
+    inv_det = np.divide(1.0, det, out=np.zeros_like(det), where=valid)
+
+    tvec = origin - v0
+    u = np.einsum("ij,ij->i", tvec, pvec) * inv_det
+    qvec = np.cross(tvec, e1)
+    v = (qvec @ direction) * inv_det
+    t = np.einsum("ij,ij->i", e2, qvec) * inv_det
+
+    hit = valid & (u >= 0) & (v >= 0) & (u + v <= 1) & (t > epsilon)
+    return np.where(hit, t, np.inf), u, v
+
+
+def ray_boxes_intersect(origin, direction, box_min, box_max):
+    """Test des dalles (slab test) vectorisé d'un rayon contre K boîtes englobantes."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inv_direction = 1.0 / direction
+        t1 = (box_min - origin) * inv_direction
+        t2 = (box_max - origin) * inv_direction
+    t_near = np.nanmax(np.minimum(t1, t2), axis=1)
+    t_far = np.nanmin(np.maximum(t1, t2), axis=1)
+    return (t_near <= t_far) & (t_far >= 0)
+
+
+def pick_triangle(origin, direction, vertices=None, faces=None, index=None, chunk_size=1 << 18):
+    """
+    Trouve le premier triangle touché par un rayon.
+    Si un index (build_triangle_index) est fourni, seules les feuilles traversées par le rayon sont testées ;
+    sinon tous les triangles sont testés par blocs de chunk_size.
+
+    :return: (indice de face, coordonnées barycentriques (w, u, v), distance) ou (-1, None, inf) si aucun triangle n'est touché.
+    """
+    origin = np.asarray(origin, dtype=np.float64)
+    direction = np.asarray(direction, dtype=np.float64)
+
+    if index is not None:
+        leaves = np.flatnonzero(ray_boxes_intersect(origin, direction, index["leaf_min"], index["leaf_max"]))
+        if len(leaves) == 0:
+            return -1, None, np.inf
+        candidates = (leaves[:, None] * index["leaf_size"] + np.arange(index["leaf_size"])).ravel()
+        candidates = candidates[candidates < len(index["face_ids"])]
+        t, u, v = ray_triangles_intersect(origin, direction, index["v0"][candidates],
+                                          index["e1"][candidates], index["e2"][candidates])
+        best = np.argmin(t)
+        if not np.isfinite(t[best]):
+            return -1, None, np.inf
+        face_id = int(index["face_ids"][candidates[best]])
+        return face_id, np.array([1 - u[best] - v[best], u[best], v[best]]), float(t[best])
+
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces)
+    best_face, best_bary, best_t = -1, None, np.inf
+    for start in range(0, len(faces), chunk_size):
+        triangles = vertices[faces[start:start + chunk_size]]
+        v0 = triangles[:, 0]
+        t, u, v = ray_triangles_intersect(origin, direction, v0, triangles[:, 1] - v0, triangles[:, 2] - v0)
+        i = np.argmin(t)
+        if t[i] < best_t:
+            best_face, best_t = start + int(i), float(t[i])
+            best_bary = np.array([1 - u[i] - v[i], u[i], v[i]])
+    return best_face, best_bary, best_t
+
+
+def pick_mesh(camera, mesh, index=None, mouse_position=None):
+    """
+    Lance un rayon depuis la position de la souris à travers la caméra et retourne la face touchée.
+
+    :return: (indice de face, indice du sommet le plus proche, barycentriques, distance) ;
+             les indices valent -1 si aucune face n'est touchée.
+    """
+    if mouse_position is None:
+        mouse_position = pr.get_mouse_position()
+    origin, direction = screen_to_world_ray(camera, mouse_position.x, mouse_position.y,
+                                            pr.get_screen_width(), pr.get_screen_height())
+    face_id, barycentric, distance = pick_triangle(origin, direction, mesh.vertices, mesh.faces, index)
+    if face_id < 0:
+        return -1, -1, None, distance
+    vertex_id = int(mesh.faces[face_id][np.argmax(barycentric)])
+    return face_id, vertex_id, barycentric, distance
+
+
+def draw_picked_face(mesh, face_id, vertex_id, color=pr.ORANGE):
+    """Met en évidence la face et le sommet sélectionnés."""
+    if face_id < 0:
+        return
+    face = mesh.faces[face_id]
+    v0 = Vector3(*mesh.vertices[face[0]])
+    v1 = Vector3(*mesh.vertices[face[1]])
+    v2 = Vector3(*mesh.vertices[face[2]])
+    pr.draw_triangle_3d(v0, v1, v2, color)
+    pr.draw_triangle_3d(v0, v2, v1, color)
+    pr.draw_sphere(Vector3(*mesh.vertices[vertex_id]), 0.08, pr.MAGENTA)
+
 def main():
     pr.init_window(800, 600, "PLY Viewer with Normals")
     camera = initialize_camera()
@@ -179,22 +337,35 @@ def main():
     movement_speed = 0.1
 
     # Charge et affiche le fichier PLY
-    ply_file_path = "../dolphin.ply"  # Remplacez par le chemin de votre fichier PLY
+    ply_file_path = "dolphin.ply"  # Remplacez par le chemin de votre fichier PLY
     mesh = load_ply_file(ply_file_path)
     face_normals = compute_face_normals(mesh)
     vertex_normals = compute_vertex_normals(mesh, face_normals)
+    triangle_index = build_triangle_index(mesh.vertices, mesh.faces)
+    cull_index = build_cull_index(mesh.vertices, mesh.faces, mesh.edges)
+    picked_face, picked_vertex, picked_distance = -1, -1, np.inf
 
     while not pr.window_should_close():
         update_camera_position(camera, movement_speed)
+        if pr.is_mouse_button_pressed(pr.MOUSE_BUTTON_LEFT):
+            picked_face, picked_vertex, _, picked_distance = pick_mesh(camera, mesh, triangle_index)
+
         pr.begin_drawing()
         pr.clear_background(pr.RAYWHITE)
         pr.begin_mode_3d(camera)
-        
-        draw_mesh(mesh)              # Affiche les sommets, arêtes et faces du fichier PLY
-        draw_face_normals(face_normals)  # Affiche les normales des faces
-        draw_vertex_normals(mesh, vertex_normals)  # Affiche les normales des sommets
+
+        frustum = camera_frustum_planes(camera, pr.get_screen_width(), pr.get_screen_height())
+        cull_stats = new_cull_stats()
+        draw_mesh(mesh, frustum, cull_stats, cull_index)  # Affiche les sommets, arêtes et faces du fichier PLY
+        draw_face_normals(face_normals, frustum, cull_stats)  # Affiche les normales des faces
+        draw_vertex_normals(mesh, vertex_normals, frustum, cull_stats)  # Affiche les normales des sommets
+        draw_picked_face(mesh, picked_face, picked_vertex)
 
         pr.end_mode_3d()
+        pr.draw_text(f"Culling : {cull_stats['tested']} testés, {cull_stats['culled']} éliminés, {cull_stats['drawn']} dessinés",
+                     10, 40, 20, pr.DARKGRAY)
+        if picked_face >= 0:
+            pr.draw_text(f"face {picked_face}, sommet {picked_vertex}, distance {picked_distance:.2f}", 10, 10, 20, pr.DARKGRAY)
         pr.end_drawing()
 
     pr.close_window()
@@ -10,7 +10,9 @@ from TP1.exo1_2 import (
     vector_length,
     cross_product,
     vector_normalize,
-
+    camera_frustum_planes,
+    cull_mesh,
+    new_cull_stats,
 )
 
 
@@ -62,20 +64,26 @@ def draw_transformation_axis(origin, axis, scale=3):
     scaled_axis = Vector3(origin.x + axis.x * scale, origin.y + axis.y * scale, origin.z + axis.z * scale)
     draw_vector_3(origin, scaled_axis, pr.PURPLE, thickness=0.05)
 
-def draw_mesh(mesh, color=pr.LIGHTGRAY):
-    """Dessine le mesh complet avec sommets, arêtes et faces."""
-    for face in mesh.faces:
+def draw_mesh(mesh, color=pr.LIGHTGRAY, frustum=None, stats=None):
+    """Dessine le mesh complet avec sommets, arêtes et faces, en ignorant ce qui est hors du frustum s'il est fourni."""
+    if frustum is None:
+        faces, edges, vertices = mesh.faces, mesh.edges, mesh.vertices
+    else:
+        face_ids, edge_ids, vertex_ids = cull_mesh(frustum, mesh.vertices, mesh.faces, mesh.edges, 0.05, stats=stats)
+        faces, edges, vertices = mesh.faces[face_ids], mesh.edges[edge_ids], mesh.vertices[vertex_ids]
+
+    for face in faces:
         v0 = Vector3(*mesh.vertices[face[0]])
         v1 = Vector3(*mesh.vertices[face[1]])
         v2 = Vector3(*mesh.vertices[face[2]])
         pr.draw_triangle_3d(v0, v1, v2, color)
     
-    for edge in mesh.edges:
+    for edge in edges:
         v_start = Vector3(*mesh.vertices[edge[0]])
         v_end = Vector3(*mesh.vertices[edge[1]])
         pr.draw_line_3d(v_start, v_end, pr.BLACK)
     
-    for vertex in mesh.vertices:
+    for vertex in vertices:
         pr.draw_sphere(Vector3(*vertex), 0.05, pr.RED)
 
 def load_ply_file(file_path):
@@ -138,7 +146,6 @@ def translation_matrix(tx, ty, tz):
     """Génère une matrice homogène de translation (4x4)."""
     matrix = np.eye(4)
     matrix[0:3, 3] = [tx, ty, tz]
-    print(matrix)
     return matrix
 
 def shearing_matrix(axis,s,t):
@@ -236,7 +243,8 @@ def main():
         apply_transformations_homogeneous(mesh, translation_mat, rotation_mat, scaling_mat, projection_mat)
         
         draw_plane(axis, 10)
-        draw_mesh(mesh)
+        cull_stats = new_cull_stats()
+        draw_mesh(mesh, frustum=camera_frustum_planes(camera, pr.get_screen_width(), pr.get_screen_height()), stats=cull_stats)
         pr.end_mode_3d()
 
         # GUI de contrôle pour les transformations
@@ -274,6 +282,9 @@ def main():
             pr.draw_text("Distance projection:", 750, 710, 20, pr.BLACK)
             pr.gui_slider_bar(pr.Rectangle(750, 740, 200, 20), "1.0", "8.0", d_ptr, 1.0, 8.0)
 
+        pr.draw_text(f"Culling : {cull_stats['tested']} testés, {cull_stats['culled']} éliminés, {cull_stats['drawn']} dessinés",
+                     10, 10, 20, pr.DARKGRAY)
+
         pr.end_drawing()
 
     pr.close_window()
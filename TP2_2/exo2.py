@@ -17,6 +17,8 @@ from exo1 import (
     orthographic_projection_matrix_homogeneous,
     dot_product,
 )
+from TP1.exo1_2 import camera_frustum_planes, spheres_in_frustum, record_culling, new_cull_stats
+from TP3.exo2 import create_aabb_tree, aabb_tree_build, aabb_tree_move_batch, aabb_tree_query_pairs
 
 def perspective_projection_matrix(d):
     """Génère une matrice homogène de projection en perspective avec une distance focale d."""
@@ -74,6 +76,17 @@ def main():
             "orbit_phase": np.random.uniform(0, 2 * np.pi)  # Phase initiale aléatoire
         })
 
+    # Paramètres des orbites sous forme de tableaux pour le culling vectorisé
+    orbit_phases = np.array([orbit["orbit_phase"] for orbit in orbit_cubes])
+    orbit_inclinations = np.array([orbit["inclination"] for orbit in orbit_cubes])
+    orbit_directions = np.array([1 if orbit["clockwise"] else -1 for orbit in orbit_cubes])
+    orbit_scales = np.array([orbit["scale"] for orbit in orbit_cubes])
+    cube_radius = np.linalg.norm(mesh.original_vertices, axis=1).max()
+
+    # Broad-phase : un arbre AABB dynamique contient la sphère englobante de chaque cube orbital
+    orbit_tree = create_aabb_tree(margin=0.2)
+    orbit_proxies = None
+
     camera = initialize_camera()
 
     while not pr.window_should_close():
@@ -101,13 +114,46 @@ def main():
         else:
             projection_mat = perspective_projection_matrix(distance_ptr[0])
 
+        frustum = camera_frustum_planes(camera, pr.get_screen_width(), pr.get_screen_height())
+        cull_stats = new_cull_stats()
+
         # Dessiner le cube central
         apply_transformations_homogeneous(mesh, central_transform, np.eye(4), np.eye(4), projection_mat)
-        draw_mesh(mesh)
+        draw_mesh(mesh, frustum=frustum, stats=cull_stats)
 
-        # Dessiner les cubes orbitaux
+        # Culling des cubes orbitaux par sphère englobante (valide seulement sans projection)
         current_time = pr.get_time()
-        for i in range(round(orbit_count_ptr[0])):
+        orbit_count = round(orbit_count_ptr[0])
+        orbit_angles = current_time * orbit_speed_ptr[0] * orbit_directions + orbit_phases
+        orbit_centers = np.stack([
+            orbit_radius_ptr[0] * np.cos(orbit_angles),
+            orbit_radius_ptr[0] * np.sin(orbit_angles) * np.sin(orbit_inclinations),
+            orbit_radius_ptr[0] * np.sin(orbit_angles) * np.cos(orbit_inclinations),
+            np.ones(max_orbits),
+        ], axis=1) @ central_transform.T
+        orbit_radii = cube_radius * orbit_scales * scale_factor_ptr[0]
+        if projection_type_ptr[0] == 0:
+            orbit_visible = spheres_in_frustum(frustum, orbit_centers[:orbit_count, :3], orbit_radii[:orbit_count])
+            record_culling(cull_stats, orbit_visible)
+        else:
+            orbit_visible = np.ones(orbit_count, dtype=bool)
+
+        # Mise à jour de l'arbre et recherche des cubes dont les boîtes se chevauchent
+        box_min = orbit_centers[:, :3] - orbit_radii[:, None]
+        box_max = orbit_centers[:, :3] + orbit_radii[:, None]
+        if orbit_proxies is None:
+            orbit_proxies = aabb_tree_build(orbit_tree, box_min, box_max, np.arange(max_orbits))
+        else:
+            aabb_tree_move_batch(orbit_tree, orbit_proxies, box_min, box_max)
+        orbit_pairs = aabb_tree_query_pairs(orbit_tree)
+        orbit_pairs = orbit_pairs[np.all(orbit_pairs < orbit_count, axis=1)]
+        orbit_overlapping = np.zeros(max_orbits, dtype=bool)
+        orbit_overlapping[orbit_pairs.ravel()] = True
+
+        # Dessiner les cubes orbitaux
+        for i in range(orbit_count):
+            if not orbit_visible[i]:
+                continue
             orbit = orbit_cubes[i]
             
             # Calculer l'angle en fonction du temps, de la vitesse et de la phase
@@ -137,7 +183,7 @@ def main():
 
             orbit_transform = central_transform @ orbit_translation @ orbit_rotation @ scale
             apply_transformations_homogeneous(mesh, orbit_transform, np.eye(4), np.eye(4), projection_mat)
-            draw_mesh(mesh)
+            draw_mesh(mesh, color=pr.ORANGE if orbit_overlapping[i] else pr.LIGHTGRAY, frustum=frustum, stats=cull_stats)
         for x in range(-10, 11):
             start = Vector3(x, -1, -10)
             end = Vector3(x, -1, 10)
@@ -183,6 +229,10 @@ def main():
             pr.draw_text("Distance Focale:", 10, 710, 20, pr.BLACK)
             pr.gui_slider_bar(pr.Rectangle(10, 730, 200, 20), "1.0", "8.0", distance_ptr, 1.0, 8.0)
 
+        pr.draw_text(f"Culling : {cull_stats['tested']} testés, {cull_stats['culled']} éliminés, {cull_stats['drawn']} dessinés",
+                     400, 10, 20, pr.DARKGRAY)
+        pr.draw_text(f"Paires de cubes en chevauchement (arbre AABB) : {len(orbit_pairs)}", 400, 40, 20, pr.ORANGE)
+
         pr.end_drawing()
 
     pr.close_window()
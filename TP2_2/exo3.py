@@ -1,5 +1,9 @@
 import pyray as pr
+import sys
+import time
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pyray import Vector3
 
 # Importer les fonctions et utilitaires existants
@@ -13,6 +17,9 @@ from exo1 import (
     rotation_matrix_homogeneous,
     translation_matrix
 )
+from TP1.exo1_2 import (camera_frustum_planes, spheres_in_frustum, record_culling, new_cull_stats,
+                        project_to_screen, draw_lines_3d)
+from TP3.exo2 import rotations_between
 
 def trefle_noeud(t):
     x = np.sin(3*t)
@@ -72,6 +79,371 @@ def type_courbe_manager(t, curve_type, scale_factor=1.0):
         
     return x * scale_factor, y * scale_factor, z * scale_factor
 
+@lru_cache(maxsize=32)
+def arc_length_table(curve_type, num_turns, scale_factor=1.0, resolution=4096):
+    """
+    Table de longueur d'arc cumulée d'une courbe sur [-num_turns * pi, num_turns * pi], gardée en cache :
+    la courbe est échantillonnée en resolution segments et les longueurs des cordes sont cumulées.
+
+    Returns:
+        tuple: (t (M,), longueurs cumulées (M,)), tableaux en lecture seule.
+    """
+    t = np.linspace(-num_turns * np.pi, num_turns * np.pi, resolution + 1)
+    points = np.stack(type_courbe_manager(t, curve_type, scale_factor), axis=1)
+    lengths = np.concatenate([[0.0], np.cumsum(np.linalg.norm(np.diff(points, axis=0), axis=1))])
+    for table in (t, lengths):
+        table.setflags(write=False)
+    return t, lengths
+
+def arc_length_to_t(table, s):
+    """Inverse la table : valeurs de t aux longueurs d'arc s (recherche dichotomique et interpolation linéaire)."""
+    t, lengths = table
+    s = np.clip(s, 0.0, lengths[-1])
+    i = np.clip(np.searchsorted(lengths, s, side="right"), 1, len(lengths) - 1)
+    span = lengths[i] - lengths[i - 1]
+    alpha = np.divide(s - lengths[i - 1], span, out=np.zeros_like(s, dtype=np.float64), where=span > 0)
+    return t[i - 1] + alpha * (t[i] - t[i - 1])
+
+@lru_cache(maxsize=32)
+def curve_samples(curve_type, num_samples, num_turns, scale_factor=1.0, arc_length=False):
+    """
+    Table des échantillons d'une courbe, gardée en cache (éviction LRU) : num_samples valeurs de t
+    réparties régulièrement sur [-num_turns * pi, num_turns * pi), évaluées en un seul appel.
+    Avec arc_length=True, les échantillons sont régulièrement espacés en longueur d'arc.
+
+    Returns:
+        tuple: (t (N,), points (N, 3), t normalisé dans [0, 1) (N,)), tableaux en lecture seule.
+    """
+    indices = np.arange(-num_samples // 2, num_samples // 2)
+    t = indices * (2 * np.pi * num_turns / num_samples)
+    if arc_length:
+        table = arc_length_table(curve_type, num_turns, scale_factor)
+        fractions = (indices - indices[0]) / num_samples
+        t = arc_length_to_t(table, fractions * table[1][-1])
+    points = np.stack(type_courbe_manager(t, curve_type, scale_factor), axis=1)
+    t_normal = (t + num_turns * np.pi) / (2 * num_turns * np.pi)
+    for table in (t, points, t_normal):
+        table.setflags(write=False)
+    return t, points, t_normal
+
+def adaptive_curve_samples(curve, t_start, t_end, tolerance, project=None, pilot_samples=256, max_depth=24):
+    """
+    Échantillonne une courbe avec le moins de points possible pour un écart de corde donné.
+    Une passe pilote mesure l'écart au milieu de chaque corde ; comme il varie avec le carré du pas,
+    les échantillons sont répartis selon la densité sqrt(écart / tolerance) (inversion de la table
+    cumulée, comme pour la longueur d'arc). Ensuite chaque segment dont le milieu de courbe s'écarte
+    encore de plus de tolerance du milieu de sa corde est coupé en deux, tous les segments d'un même
+    niveau étant traités en un seul lot vectorisé.
+
+    Args:
+        curve (callable): Fonction t (tableau) -> (x, y, z), par exemple trefle_noeud.
+        t_start, t_end (float): Intervalle de paramètre.
+        tolerance (float): Écart maximal toléré (unités du monde, ou pixels si project est fourni).
+        project (callable, optional): Fonction (N, 3) -> (N, 2) vers l'écran ; l'écart est alors mesuré en pixels.
+        pilot_samples (int): Nombre de segments de la passe pilote.
+        max_depth (int): Nombre maximal de subdivisions d'un segment.
+
+    Returns:
+        tuple: (t (N,), points (N, 3), statistiques {"samples", "evaluations", "iterations"}).
+    """
+    def evaluate(t):
+        return np.stack(curve(t), axis=1)
+
+    def measure(points):
+        return points if project is None else project(points)
+
+    # Passe pilote : densité d'échantillons nécessaire sur chaque segment pilote
+    pilot_t = np.linspace(t_start, t_end, pilot_samples + 1)
+    pilot_screen = measure(evaluate(pilot_t))
+    pilot_mid_screen = measure(evaluate((pilot_t[:-1] + pilot_t[1:]) / 2))
+    deviation = np.linalg.norm(pilot_mid_screen - (pilot_screen[:-1] + pilot_screen[1:]) / 2, axis=1)
+    density = np.concatenate([[0.0], np.cumsum(1.05 * np.sqrt(deviation / tolerance))])
+    nb_segments = max(1, int(np.ceil(density[-1])))
+    t = np.interp(np.linspace(0, density[-1], nb_segments + 1), density, pilot_t) if density[-1] > 0 \
+        else np.array([t_start, t_end], dtype=np.float64)
+    points = evaluate(t)
+    stats = {"samples": 0, "evaluations": 2 * pilot_samples + 1 + len(t), "iterations": 0}
+
+    kept_t, kept_points = [t], [points]
+    screen = measure(points)
+    start_t, end_t = t[:-1], t[1:]
+    start_points, end_points = points[:-1], points[1:]
+    start_screen, end_screen = screen[:-1], screen[1:]
+    for _ in range(max_depth):
+        if len(start_t) == 0:
+            break
+        stats["iterations"] += 1
+        mid_screen = measure(evaluate((start_t + end_t) / 2))
+        stats["evaluations"] += len(start_t)
+        deviation = np.linalg.norm(mid_screen - (start_screen + end_screen) / 2, axis=1)
+        fail = np.flatnonzero(deviation > tolerance)
+        if len(fail) == 0:
+            break
+
+        # Un segment trop éloigné de sa corde est coupé en k morceaux égaux, k ~ sqrt(écart / tolerance)
+        k = np.maximum(2, np.ceil(1.05 * np.sqrt(deviation[fail] / tolerance)).astype(np.int64))
+        owner = np.repeat(np.arange(len(fail)), k - 1)
+        offsets = np.cumsum(k) - k
+        rank = np.arange(len(owner)) - np.repeat(np.cumsum(k - 1) - (k - 1), k - 1) + 1
+        fail_start, fail_end = start_t[fail], end_t[fail]
+        new_t = fail_start[owner] + (fail_end - fail_start)[owner] * rank / k[owner]
+        new_points = evaluate(new_t)
+        new_screen = measure(new_points)
+        stats["evaluations"] += len(new_t)
+        kept_t.append(new_t)
+        kept_points.append(new_points)
+
+        # Les morceaux deviennent les segments à vérifier au niveau suivant
+        interior = offsets[owner] + rank
+        first, last = offsets, offsets + k - 1
+        segments = []
+        for starts, ends, news in ((start_t, end_t, new_t), (start_points, end_points, new_points),
+                                   (start_screen, end_screen, new_screen)):
+            child_start = np.empty((k.sum(),) + starts.shape[1:])
+            child_end = np.empty_like(child_start)
+            child_start[first] = starts[fail]
+            child_end[last] = ends[fail]
+            child_start[interior] = news
+            child_end[interior - 1] = news
+            segments.append((child_start, child_end))
+        (start_t, end_t), (start_points, end_points), (start_screen, end_screen) = segments
+
+    t = np.concatenate(kept_t)
+    order = np.argsort(t)
+    stats["samples"] = len(t)
+    return t[order], np.concatenate(kept_points)[order], stats
+
+def curve_cube_transforms(points, t, scales, time_angle):
+    """
+    Matrices locales (N, 4, 4) des cubes : translation sur la courbe, rotation autour de y d'angle
+    time_angle + t et mise à l'échelle ; seule la rotation dépend du temps.
+    """
+    angles = time_angle + t
+    cos_a = np.cos(angles) * scales
+    sin_a = np.sin(angles) * scales
+    transforms = np.zeros((len(t), 4, 4))
+    transforms[:, 0, 0] = cos_a
+    transforms[:, 0, 2] = sin_a
+    transforms[:, 1, 1] = scales
+    transforms[:, 2, 0] = -sin_a
+    transforms[:, 2, 2] = cos_a
+    transforms[:, :3, 3] = points
+    transforms[:, 3, 3] = 1
+    return transforms
+
+def parallel_transport_frames(points, closed=False):
+    """
+    Repères à rotation minimale (transport parallèle) le long d'une courbe échantillonnée.
+    Le repère k est le produit des rotations entre tangentes successives appliqué au premier repère ;
+    ces produits préfixes sont calculés par balayage doublant (log2(N) produits matriciels par lots).
+    Pour une courbe fermée, la torsion résiduelle au raccord est répartie selon la longueur d'arc.
+
+    Args:
+        points (np.ndarray): Points (N, 3) ; pour une courbe fermée le premier point n'est pas répété.
+        closed (bool): Courbe fermée.
+
+    Returns:
+        tuple: (tangentes, normales, binormales), trois tableaux (N, 3).
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if closed:
+        tangents = np.roll(points, -1, axis=0) - np.roll(points, 1, axis=0)
+    else:
+        tangents = np.gradient(points, axis=0)
+    tangents /= np.maximum(np.linalg.norm(tangents, axis=1), 1e-300)[:, None]
+
+    prefix = np.empty((len(points), 3, 3))
+    prefix[0] = np.eye(3)
+    prefix[1:] = rotations_between(tangents[:-1], tangents[1:])
+    step = 1
+    while step < len(points):
+        prefix[step:] = prefix[step:] @ prefix[:-step].copy()
+        step *= 2
+
+    helper = np.array([1.0, 0, 0]) if abs(tangents[0, 0]) < 0.9 else np.array([0, 1.0, 0])
+    normal0 = np.cross(tangents[0], helper)
+    normal0 /= np.linalg.norm(normal0)
+    normals = prefix @ normal0
+
+    if closed:
+        # Angle entre le repère transporté jusqu'au raccord et le premier repère
+        transported = rotations_between(tangents[-1:], tangents[:1])[0] @ normals[-1]
+        twist = np.arctan2(np.cross(transported, normals[0]) @ tangents[0], transported @ normals[0])
+        segment_lengths = np.linalg.norm(np.diff(points, axis=0), axis=1)
+        fraction = np.concatenate([[0.0], np.cumsum(segment_lengths)])
+        fraction /= fraction[-1] + np.linalg.norm(points[0] - points[-1])
+        angle = twist * fraction
+        binormals = np.cross(tangents, normals)
+        normals = np.cos(angle)[:, None] * normals + np.sin(angle)[:, None] * binormals
+
+    normals -= np.einsum("ij,ij->i", normals, tangents)[:, None] * tangents
+    normals /= np.linalg.norm(normals, axis=1)[:, None]
+    return tangents, normals, np.cross(tangents, normals)
+
+def tube_mesh_arrays(points, radius=0.05, sides=12, closed=False):
+    """
+    Extrude une section circulaire le long d'une courbe en un seul maillage de triangles indexé.
+
+    Returns:
+        tuple: (sommets (N * sides, 3), normales (N * sides, 3), triangles (M, 3) d'indices).
+    """
+    points = np.asarray(points, dtype=np.float64)
+    _, normals, binormals = parallel_transport_frames(points, closed)
+    angles = np.linspace(0, 2 * np.pi, sides, endpoint=False)
+    ring = (np.cos(angles)[None, :, None] * normals[:, None, :]
+            + np.sin(angles)[None, :, None] * binormals[:, None, :])
+    vertices = (points[:, None, :] + radius * ring).reshape(-1, 3)
+
+    nb_rings = len(points)
+    ring_index = np.arange(nb_rings if closed else nb_rings - 1)
+    side_index = np.arange(sides)
+    a = ring_index[:, None] * sides + side_index
+    b = ring_index[:, None] * sides + (side_index + 1) % sides
+    c = ((ring_index[:, None] + 1) % nb_rings) * sides + side_index
+    d = ((ring_index[:, None] + 1) % nb_rings) * sides + (side_index + 1) % sides
+    triangles = np.stack([np.stack([a, b, c], axis=-1), np.stack([b, d, c], axis=-1)], axis=-2).reshape(-1, 3)
+    return vertices, ring.reshape(-1, 3), triangles
+
+def upload_tube_mesh(vertices, normals, triangles):
+    """
+    Envoie un maillage au GPU. Les indices raylib sont sur 16 bits : un maillage de plus de 65 536 sommets
+    est découpé en plusieurs maillages raylib.
+
+    Returns:
+        list: Les pr.Mesh chargés (à libérer avec pr.unload_mesh).
+    """
+    meshes = []
+    limit = 1 << 16
+    start = 0
+    while start < len(triangles):
+        # Plus grand bloc de triangles consécutifs n'utilisant pas plus de 65 536 sommets distincts
+        size = 2 * limit
+        while True:
+            used, block = np.unique(triangles[start:start + size], return_inverse=True)
+            if len(used) <= limit:
+                break
+            size //= 2
+        block = block.reshape(-1, 3)
+        end = start + len(block)
+
+        mesh = pr.Mesh()
+        mesh.vertexCount = len(used)
+        mesh.triangleCount = len(block)
+        for field, data, ctype in (("vertices", vertices[used], "float"),
+                                   ("normals", normals[used], "float"),
+                                   ("indices", block, "unsigned short")):
+            array = np.ascontiguousarray(data, dtype=np.float32 if ctype == "float" else np.uint16)
+            pointer = pr.ffi.cast(ctype + " *", pr.mem_alloc(array.nbytes))
+            pr.ffi.memmove(pointer, pr.ffi.from_buffer(array), array.nbytes)
+            setattr(mesh, field, pointer)
+        pr.upload_mesh(mesh, False)
+        meshes.append(mesh)
+        start = end
+    return meshes
+
+def _unit(vectors):
+    """Normalise des vecteurs (..., 3) ; les vecteurs nuls restent nuls."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+def _segment_pair_solid_angles(p1, p2, p3, p4):
+    """
+    Angle solide exact Ω de l'intégrale de Gauss pour des paires de segments [p1, p2] et [p3, p4]
+    (formule de Klenin et Langowski), tous les tableaux étant diffusés ensemble.
+    """
+    r13, r14, r23, r24 = p3 - p1, p4 - p1, p3 - p2, p4 - p2
+    n1, n2 = _unit(np.cross(r13, r14)), _unit(np.cross(r14, r24))
+    n3, n4 = _unit(np.cross(r24, r23)), _unit(np.cross(r23, r13))
+    omega = sum(np.arcsin(np.clip(np.einsum("...i,...i->...", a, b), -1.0, 1.0))
+                for a, b in ((n1, n2), (n2, n3), (n3, n4), (n4, n1)))
+    return omega * np.sign(np.einsum("...i,...i->...", np.cross(p4 - p3, p2 - p1), r13))
+
+def _writhe_block_pairs(task):
+    """
+    Somme de Ω et de |Ω| sur une liste de paires de blocs de segments.
+    Les paires de blocs éloignés utilisent l'approximation au point milieu de l'intégrande,
+    les autres la formule exacte ; les paires de segments voisins (ou identiques) sont exclues.
+    """
+    starts, ends, block_size, pairs, closed = task
+    nb_segments = len(starts)
+    writhe = crossings = 0.0
+    for bi, bj, far in pairs:
+        i = np.arange(bi * block_size, min((bi + 1) * block_size, nb_segments))
+        j = np.arange(bj * block_size, min((bj + 1) * block_size, nb_segments))
+        if far:
+            # (vi × vj) · (mi - mj) et |mi - mj|² développés en produits matriciels
+            vi, vj = ends[i] - starts[i], ends[j] - starts[j]
+            mi, mj = starts[i] + 0.5 * vi, starts[j] + 0.5 * vj
+            numerator = np.cross(mi, vi) @ vj.T + vi @ np.cross(mj, vj).T
+            distance2 = (mi * mi).sum(axis=1)[:, None] + (mj * mj).sum(axis=1)[None, :] - 2 * mi @ mj.T
+            omega = numerator / (distance2 * np.sqrt(distance2))
+        else:
+            omega = _segment_pair_solid_angles(starts[i][:, None], ends[i][:, None],
+                                               starts[j][None, :], ends[j][None, :])
+            keep = j[None, :] > i[:, None] + 1
+            if closed:
+                keep &= ~((i[:, None] == 0) & (j[None, :] == nb_segments - 1))
+            omega = np.where(keep, omega, 0.0)
+        writhe += omega.sum()
+        crossings += np.abs(omega).sum()
+    return writhe, crossings
+
+def knot_invariants(points, closed=True, block_size=256, far_factor=8.0, max_workers=None):
+    """
+    Writhe et nombre moyen de croisements d'une courbe polygonale par l'intégrale double de Gauss :
+    Wr = (1 / 2π) Σ_{i<j} Ω_ij et ACN = (1 / 2π) Σ_{i<j} |Ω_ij| sur les paires de segments.
+    Les segments sont groupés en blocs consécutifs munis de leur boîte englobante ; une paire de blocs
+    dont les boîtes sont distantes de plus de far_factor fois la plus grande longueur de segment est
+    évaluée au point milieu (erreur relative en (longueur / distance)²), les autres exactement.
+
+    Args:
+        points (np.ndarray): Sommets (N, 3) ; pour une courbe fermée le premier sommet n'est pas répété.
+        closed (bool): Courbe fermée.
+        block_size (int): Nombre de segments par bloc.
+        far_factor (float, optional): Seuil d'éloignement ; None pour un calcul exact partout.
+        max_workers (int, optional): Nombre de processus ; None ou 1 pour un traitement séquentiel.
+
+    Returns:
+        dict: writhe, acn, et les nombres de paires de blocs exactes et approchées.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    starts = points if closed else points[:-1]
+    ends = np.roll(points, -1, axis=0) if closed else points[1:]
+    nb_blocks = -(-len(starts) // block_size)
+
+    padded = np.full(nb_blocks * block_size, len(starts) - 1)
+    padded[:len(starts)] = np.arange(len(starts))
+    blocks = np.stack([starts[padded], ends[padded]], axis=1).reshape(nb_blocks, -1, 3)
+    lower, upper = blocks.min(axis=1), blocks.max(axis=1)
+    gaps = np.maximum(0.0, np.maximum(lower[:, None] - upper[None, :], lower[None, :] - upper[:, None]))
+    distances = np.linalg.norm(gaps, axis=-1)
+    longest = np.linalg.norm(ends - starts, axis=1).max()
+
+    bi, bj = np.triu_indices(nb_blocks)
+    far = np.zeros(len(bi), dtype=bool) if far_factor is None else distances[bi, bj] > far_factor * longest
+    pairs = list(zip(bi.tolist(), bj.tolist(), far.tolist()))
+    nb_tasks = max(1, 4 * (max_workers or 1))
+    tasks = [(starts, ends, block_size, pairs[k::nb_tasks], closed) for k in range(nb_tasks)]
+
+    if max_workers and max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_writhe_block_pairs, tasks))
+    else:
+        results = list(map(_writhe_block_pairs, tasks))
+    writhe, crossings = np.sum(results, axis=0)
+    return {"writhe": writhe / (2 * np.pi), "acn": crossings / (2 * np.pi),
+            "exact_pairs": int((~far).sum()), "far_pairs": int(far.sum())}
+
+def benchmark_knot_invariants(nb_segments=10_000, max_workers=None):
+    """Mesure le calcul des invariants sur chaque noeud échantillonné avec nb_segments segments."""
+    for curve_type, name in enumerate(["trèfle", "huit", "4,3", "Solomon"]):
+        _, points, _ = curve_samples(curve_type, nb_segments, 1, 2.0)
+        debut = time.perf_counter()
+        result = knot_invariants(points, max_workers=max_workers)
+        duree = time.perf_counter() - debut
+        print(f"{name:8s} N={nb_segments} Wr={result['writhe']:+.4f} ACN={result['acn']:.4f} "
+              f"({result['exact_pairs']} paires de blocs exactes, {result['far_pairs']} approchées) {duree:.2f} s")
+
 def main():
     pr.init_window(1000, 900, "Cubes tournants le long d'une hélice")
     pr.set_target_fps(180)
@@ -80,6 +452,7 @@ def main():
     mesh_file = "cube.ply"
     mesh = load_ply_file(mesh_file)
     initialize_mesh_for_transforming(mesh)
+    cube_radius = np.linalg.norm(mesh.original_vertices, axis=1).max()
 
     # Contrôles GUI
     translate_x_ptr = pr.ffi.new('float *', 0.0)
@@ -95,6 +468,10 @@ def main():
     spacing_between_turns_ptr = pr.ffi.new('float *', 10.0)  # Espacement entre les tours
     nb_cubes_ptr = pr.ffi.new('float *', 20.0)  # Nombre de cubes par tour      
     courbe_type_ptr = pr.ffi.new('int *', 0)
+    espacement_arc = False  # Répartition des cubes à longueur d'arc constante
+    mode_tube = False  # Courbe extrudée en tube (un seul maillage) au lieu des cubes
+    tube_meshes, tube_key = [], None
+    tube_material = pr.load_material_default()
 
 
     camera = initialize_camera()
@@ -123,26 +500,53 @@ def main():
         spacing = spacing_between_turns_ptr[0]  # Récupérer la valeur dynamique de l'espacement
 
 
-        for i in range(-num_cubes // 2, num_cubes // 2):
-            t = i * (2 * np.pi * num_turns / num_cubes)
-            x, y, z = type_courbe_manager(t, courbe_type_ptr[0], scale_factor=2)
-            cube_translation = translation_matrix(x, y, z)
+        # Culling des cubes par sphère englobante, calculé pour tous les cubes à la fois
+        frustum = camera_frustum_planes(camera, pr.get_screen_width(), pr.get_screen_height())
+        cull_stats = new_cull_stats()
+        cube_t, cube_points, cube_t_normal = curve_samples(courbe_type_ptr[0], num_cubes, num_turns, 2.0,
+                                                                 espacement_arc)
+        cube_centers = np.hstack([cube_points, np.ones((len(cube_t), 1))]) @ central_transform.T
+        cube_scales = cube_scale_ptr[0] * cube_t_normal
+        cube_visible = spheres_in_frustum(frustum, cube_centers[:, :3], np.abs(cube_radius * cube_scales))
+        record_culling(cull_stats, cube_visible)
 
-            # Rotation et mise à l'échelle
-            time_angle = pr.get_time()
-            angle_prog = time_angle+ t
+        # Tracé de la courbe avec le minimum de points pour une erreur d'un pixel à l'écran
+        def vers_ecran(points):
+            monde = points @ central_transform[:3, :3].T + central_transform[:3, 3]
+            return project_to_screen(camera, monde, pr.get_screen_width(), pr.get_screen_height())[0]
+        courbe = lambda t: type_courbe_manager(t, courbe_type_ptr[0], scale_factor=2)
+        _, curve_points, curve_stats = adaptive_curve_samples(courbe, -num_turns * np.pi, num_turns * np.pi,
+                                                              1.0, project=vers_ecran)
+        curve_world = curve_points @ central_transform[:3, :3].T + central_transform[:3, 3]
+        draw_lines_3d(curve_world[:-1], curve_world[1:], pr.DARKBLUE)
 
-            cube_rotation = rotation_matrix_homogeneous(Vector3(0, 1, 0), angle_prog)
-            t_normal = (t + (num_turns * np.pi)) / (2 * num_turns * np.pi)
-            prog_scale = cube_scale_ptr[0] * t_normal
-            cube_scaling = uniform_scaling_matrix_homogeneous(prog_scale)
-
-            # Combiner les transformations
-            cube_transform = central_transform @ cube_translation @ cube_rotation @ cube_scaling
-            apply_transformations_homogeneous(mesh, cube_transform, np.eye(4), np.eye(4), np.eye(4))
-            draw_mesh(mesh)
+        # Combiner les transformations de tous les cubes visibles
+        visible_indices = np.flatnonzero(cube_visible)
+        cube_transforms = central_transform @ curve_cube_transforms(
+            cube_points[visible_indices], cube_t[visible_indices], cube_scales[visible_indices], pr.get_time())
+        if mode_tube:
+            # Le tube n'est régénéré que si la courbe ou son rayon changent
+            key = (courbe_type_ptr[0], num_turns, cube_scale_ptr[0])
+            if key != tube_key:
+                for tube_mesh in tube_meshes:
+                    pr.unload_mesh(tube_mesh)
+                _, tube_points, _ = curve_samples(courbe_type_ptr[0], max(int(num_turns * 400), 16), num_turns, 2.0)
+                tube_meshes = upload_tube_mesh(*tube_mesh_arrays(tube_points, cube_scale_ptr[0], 16,
+                                                                 closed=float(num_turns).is_integer()))
+                tube_key = key
+            tube_matrix = pr.Matrix(*central_transform.flatten())
+            for tube_mesh in tube_meshes:
+                pr.draw_mesh(tube_mesh, tube_material, tube_matrix)
+        else:
+            for cube_transform in cube_transforms:
+                apply_transformations_homogeneous(mesh, cube_transform, np.eye(4), np.eye(4), np.eye(4))
+                draw_mesh(mesh, frustum=frustum, stats=cull_stats)
 
         pr.end_mode_3d()
+        pr.draw_text(f"Culling : {cull_stats['tested']} testés, {cull_stats['culled']} éliminés, {cull_stats['drawn']} dessinés",
+                     400, 10, 20, pr.DARKGRAY)
+        pr.draw_text(f"Courbe : {curve_stats['samples']} sommets, {curve_stats['evaluations']} évaluations",
+                     400, 40, 20, pr.DARKBLUE)
 
         # Contrôles GUI
         pr.draw_text("Translation X:", 10, 40, 20, pr.BLACK)
@@ -175,11 +579,21 @@ def main():
             courbe_type_ptr[0] = 2
         if pr.gui_button(pr.Rectangle(170, 690, 150, 30), "Noeud Solomon"):
             courbe_type_ptr[0] = 3
+        if pr.gui_button(pr.Rectangle(10, 730, 310, 30),
+                         "Espacement : longueur d'arc" if espacement_arc else "Espacement : paramètre t"):
+            espacement_arc = not espacement_arc
+        if pr.gui_button(pr.Rectangle(10, 770, 310, 30), "Rendu : tube" if mode_tube else "Rendu : cubes"):
+            mode_tube = not mode_tube
 
 
         pr.end_drawing()
 
+    for tube_mesh in tube_meshes:
+        pr.unload_mesh(tube_mesh)
     pr.close_window()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if "--benchmark" in sys.argv:
+        benchmark_knot_invariants()
+    else:
+        main()
\ No newline at end of file
@@ -2,11 +2,17 @@ import pyray as pr
 import numpy as np
 from pyray import Vector3
 import math
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 from  exo1 import ( cross_product,
                    dot_product,
                    vector_length,
-                   vector_normalize)
+                   vector_normalize,
+                   load_ply_file)
+from TP1.exo1_2 import draw_lines_3d
+from TP3.exo2 import rotations_between
 """
 Bras humain rotatable avec contrôle de caméra
 
@@ -89,6 +95,21 @@ def rotation_matrix_yaw_pitch_roll(yaw, pitch, roll):
     # Combine the rotations in order: Rz * Ry * Rx
     return Rz @ Ry @ Rx
 
+def yaw_pitch_roll_matrices(yaw, pitch, roll):
+    """
+    Version vectorisée de rotation_matrix_yaw_pitch_roll : angles en degrés de forme quelconque (...,),
+    retourne les rotations Rz @ Ry @ Rx de forme (..., 3, 3).
+    """
+    yaw, pitch, roll = np.broadcast_arrays(*(np.radians(np.asarray(a, dtype=np.float64)) for a in (yaw, pitch, roll)))
+    cy, sy = np.cos(yaw), np.sin(yaw)
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    cr, sr = np.cos(roll), np.sin(roll)
+    return np.stack([
+        np.stack([cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr], axis=-1),
+        np.stack([sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr], axis=-1),
+        np.stack([-sp, cp * sr, cp * cr], axis=-1),
+    ], axis=-2)
+
 def apply_rotation(point, matrix):
     """
     Applique une matrice de rotation à un point 3D.
@@ -208,6 +229,504 @@ def apply_transformation_to_segment(position, rotation_matrix, reference_positio
     return new_position, transformation_matrix
 
 
+def yaw_pitch_roll_from_matrices(rotations):
+    """Inverse de yaw_pitch_roll_matrices : angles (lacet, tangage, roulis) en degrés de rotations (..., 3, 3)."""
+    rotations = np.asarray(rotations, dtype=np.float64)
+    yaw = np.arctan2(rotations[..., 1, 0], rotations[..., 0, 0])
+    pitch = -np.arcsin(np.clip(rotations[..., 2, 0], -1.0, 1.0))
+    roll = np.arctan2(rotations[..., 2, 1], rotations[..., 2, 2])
+    return np.degrees(np.stack([yaw, pitch, roll], axis=-1))
+
+def create_skeleton(parents, offsets, root_transform=None):
+    """
+    Crée un squelette : arbre d'articulations quelconque décrit par le tableau des parents.
+
+    Paramètres :
+    - parents (array-like) : Indice du parent de chaque articulation (-1 pour une racine).
+    - offsets (array-like) : Position (J, 3) de chaque articulation dans le repère de son parent.
+    - root_transform (np.ndarray, optionnel) : Matrice 4x4 plaçant les racines dans le monde.
+
+    Retourne :
+    - dict : Le squelette. La transformation locale d'une articulation est T(offset) @ R, sa transformation
+      monde world[parent] @ local. Les articulations sont regroupées par profondeur pour mettre à jour
+      un niveau entier en un seul produit matriciel par lot.
+    """
+    parents = np.asarray(parents, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.float64).reshape(-1, 3)
+    nb_joints = len(parents)
+    if len(offsets) != nb_joints:
+        raise ValueError(f"parents ({nb_joints}) et offsets ({len(offsets)}) doivent décrire "
+                         f"le même nombre d'articulations")
+    out_of_range = np.flatnonzero((parents < -1) | (parents >= nb_joints))
+    if len(out_of_range):
+        raise ValueError(f"Parent hors de [-1, {nb_joints - 1}] pour les articulations {out_of_range.tolist()}")
+    own_parent = np.flatnonzero(parents == np.arange(nb_joints))
+    if len(own_parent):
+        raise ValueError(f"Les articulations {own_parent.tolist()} sont leur propre parent")
+
+    # Profondeur de chaque articulation, propagée depuis les racines
+    depth = np.where(parents < 0, 0, -1)
+    for _ in range(nb_joints):
+        pending = depth < 0
+        if not pending.any():
+            break
+        known = pending & (depth[parents] >= 0)
+        depth[known] = depth[parents[known]] + 1
+    if np.any(depth < 0):
+        raise ValueError("Le tableau des parents contient un cycle")
+
+    local = np.tile(np.eye(4), (nb_joints, 1, 1))
+    local[:, :3, 3] = offsets
+    return {
+        "parents": parents,
+        "local": local,
+        "world": local.copy(),
+        "dirty": np.ones(nb_joints, dtype=bool),
+        "levels": [np.flatnonzero(depth == d) for d in range(depth.max() + 1 if nb_joints else 0)],
+        "root_transform": np.eye(4) if root_transform is None else np.asarray(root_transform, dtype=np.float64),
+    }
+
+def set_joint_rotations(skeleton, joints, rotations):
+    """
+    Modifie la rotation locale (3x3 ou 4x4) d'une ou plusieurs articulations et marque leur sous-arbre
+    à recalculer. Les articulations dont la rotation est inchangée ne sont pas marquées.
+    """
+    joints = np.atleast_1d(np.asarray(joints, dtype=np.int64))
+    rotations = np.asarray(rotations, dtype=np.float64)[..., :3, :3].reshape(-1, 3, 3)
+    changed = np.any(skeleton["local"][joints, :3, :3] != rotations, axis=(1, 2))
+    skeleton["local"][joints[changed], :3, :3] = rotations[changed]
+    skeleton["dirty"][joints[changed]] = True
+
+def set_joint_offsets(skeleton, joints, offsets):
+    """Modifie la position locale d'une ou plusieurs articulations et marque leur sous-arbre à recalculer."""
+    joints = np.atleast_1d(np.asarray(joints, dtype=np.int64))
+    skeleton["local"][joints, :3, 3] = np.asarray(offsets, dtype=np.float64).reshape(-1, 3)
+    skeleton["dirty"][joints] = True
+
+def update_world_transforms(skeleton):
+    """
+    Recalcule les transformations monde des seules articulations marquées et de leurs descendants,
+    niveau par niveau.
+
+    Retourne :
+    - int : Le nombre d'articulations recalculées.
+    """
+    dirty, parents = skeleton["dirty"], skeleton["parents"]
+    local, world = skeleton["local"], skeleton["world"]
+    if not dirty.any():
+        return 0
+    recomputed = 0
+    for level in skeleton["levels"]:
+        level_parents = parents[level]
+        roots = level_parents < 0
+        dirty[level] |= ~roots & dirty[np.maximum(level_parents, 0)]
+        joints = level[dirty[level]]
+        if len(joints) == 0:
+            continue
+        joint_parents = parents[joints]
+        is_root = joint_parents < 0
+        world[joints[is_root]] = skeleton["root_transform"] @ local[joints[is_root]]
+        world[joints[~is_root]] = world[joint_parents[~is_root]] @ local[joints[~is_root]]
+        recomputed += len(joints)
+    dirty[:] = False
+    return recomputed
+
+def joint_positions(skeleton):
+    """Retourne les positions monde (J, 3) des articulations (vue sur les transformations en cache)."""
+    return skeleton["world"][:, :3, 3]
+
+def skeleton_chain(skeleton, effector):
+    """Indices des articulations de la racine jusqu'à effector inclus."""
+    chain = [effector]
+    while skeleton["parents"][chain[-1]] >= 0:
+        chain.append(int(skeleton["parents"][chain[-1]]))
+    return np.array(chain[::-1])
+
+def _chain_base(skeleton, chain):
+    """Transformation monde du parent de la première articulation de la chaîne."""
+    parent = skeleton["parents"][chain[0]]
+    update_world_transforms(skeleton)
+    return skeleton["root_transform"] if parent < 0 else skeleton["world"][parent]
+
+def chain_forward_kinematics(angles, offsets, effector_offset, base=None):
+    """
+    Cinématique directe d'une chaîne, vectorisée sur P poses.
+
+    Paramètres :
+    - angles (np.ndarray) : Angles (P, n, 3) en degrés (lacet, tangage, roulis) des n articulations.
+    - offsets (np.ndarray) : Positions locales (n, 3) des articulations.
+    - effector_offset (np.ndarray) : Position locale (3,) de l'effecteur dans le repère de la dernière articulation.
+    - base (np.ndarray, optionnel) : Transformation 4x4 du repère parent de la chaîne.
+
+    Retourne :
+    - tuple : (rotations monde (P, n, 3, 3) des repères parents de chaque articulation,
+      positions des articulations (P, n, 3), position de l'effecteur (P, 3), rotations locales (P, n, 3, 3)).
+    """
+    base = np.eye(4) if base is None else base
+    local = yaw_pitch_roll_matrices(angles[..., 0], angles[..., 1], angles[..., 2])
+    nb_poses, nb_joints = angles.shape[:2]
+    parent_rotations = np.empty((nb_poses, nb_joints, 3, 3))
+    positions = np.empty((nb_poses, nb_joints, 3))
+    rotation = np.broadcast_to(base[:3, :3], (nb_poses, 3, 3))
+    position = np.broadcast_to(base[:3, 3], (nb_poses, 3))
+    for k in range(nb_joints):
+        position = position + rotation @ offsets[k]
+        parent_rotations[:, k] = rotation
+        positions[:, k] = position
+        rotation = rotation @ local[:, k]
+    return parent_rotations, positions, position + rotation @ effector_offset, local
+
+def solve_ik_dls(skeleton, effector, targets, joint_limits=None, iterations=20, damping=0.3, initial=None):
+    """
+    Cinématique inverse par moindres carrés amortis (Jacobien) : déplace effector vers les cibles
+    en modifiant les angles (lacet, tangage, roulis) de ses ancêtres, les longueurs étant fixées par
+    le squelette. Toutes les cibles sont résolues ensemble avec un nombre fixe d'itérations.
+
+    Paramètres :
+    - skeleton (dict) : Le squelette (les articulations hors de la chaîne sont inchangées).
+    - effector (int) : L'articulation à amener sur la cible.
+    - targets (np.ndarray) : Cible (3,) ou cibles (P, 3).
+    - joint_limits (np.ndarray, optionnel) : Bornes (n, 3, 2) en degrés de chaque angle ; [-180, 180] par défaut.
+    - iterations (int) : Nombre d'itérations (budget fixe).
+    - damping (float) : Amortissement λ de (J J^T + λ² I).
+    - initial (np.ndarray, optionnel) : Angles (n, 3) ou (P, n, 3) de départ ; la pose actuelle par défaut.
+
+    Retourne :
+    - tuple : (joints (n,) de la chaîne, angles (P, n, 3) en degrés, distances restantes (P,)) ;
+      sans la dimension P pour une cible unique.
+    """
+    chain = skeleton_chain(skeleton, effector)
+    joints = chain[:-1]
+    base = _chain_base(skeleton, chain)
+    targets = np.asarray(targets, dtype=np.float64)
+    single = targets.ndim == 1
+    targets = targets.reshape(-1, 3)
+    offsets = skeleton["local"][joints, :3, 3]
+    effector_offset = skeleton["local"][effector, :3, 3]
+
+    if initial is None:
+        initial = yaw_pitch_roll_from_matrices(skeleton["local"][joints, :3, :3])
+    angles = np.array(np.broadcast_to(initial, (len(targets), len(joints), 3)), dtype=np.float64)
+    if joint_limits is None:
+        joint_limits = np.tile([-180.0, 180.0], (len(joints), 3, 1))
+    low, high = joint_limits[..., 0], joint_limits[..., 1]
+    np.clip(angles, low, high, out=angles)
+    regularisation = damping ** 2 * np.eye(3)
+
+    for _ in range(iterations):
+        parent_rotations, positions, end, local = chain_forward_kinematics(angles, offsets, effector_offset, base)
+        error = targets - end
+        # Axes monde des rotations élémentaires : z du parent, puis y après Rz, puis x après Rz @ Ry
+        axis_yaw = parent_rotations[..., :, 2]
+        rz = yaw_pitch_roll_matrices(angles[..., 0], 0.0, 0.0)
+        axis_pitch = np.einsum("pkij,pkj->pki", parent_rotations @ rz, np.broadcast_to([0.0, 1.0, 0.0], angles.shape))
+        axis_roll = np.einsum("pkij,pkj->pki", parent_rotations, local[..., :, 0])
+        lever = end[:, None, :] - positions
+        jacobian = np.stack([np.cross(axis_yaw, lever), np.cross(axis_pitch, lever), np.cross(axis_roll, lever)],
+                            axis=2).reshape(len(targets), -1, 3).transpose(0, 2, 1)
+        step = np.linalg.solve(jacobian @ jacobian.transpose(0, 2, 1) + regularisation, error[..., None])
+        angles += np.degrees(jacobian.transpose(0, 2, 1) @ step).reshape(angles.shape)
+        np.clip(angles, low, high, out=angles)
+
+    _, _, end, _ = chain_forward_kinematics(angles, offsets, effector_offset, base)
+    distances = np.linalg.norm(targets - end, axis=1)
+    return (joints, angles[0], distances[0]) if single else (joints, angles, distances)
+
+def solve_ik_fabrik(skeleton, effector, targets, max_bend=None, iterations=10, tolerance=1e-4):
+    """
+    Cinématique inverse FABRIK (allers-retours sur les positions) vectorisée sur P cibles.
+    Les longueurs des segments sont conservées exactement ; max_bend limite, pour chaque articulation
+    intérieure, l'angle entre le segment qui y arrive et celui qui en part.
+
+    Paramètres :
+    - skeleton (dict) : Le squelette.
+    - effector (int) : L'articulation à amener sur la cible.
+    - targets (np.ndarray) : Cible (3,) ou cibles (P, 3).
+    - max_bend (array-like, optionnel) : Angle maximal en degrés aux n - 1 articulations intérieures.
+    - iterations (int) : Nombre maximal d'allers-retours (budget fixe).
+    - tolerance (float) : Distance à la cible en dessous de laquelle une chaîne n'est plus modifiée.
+
+    Retourne :
+    - tuple : (chaîne (n + 1,) des articulations, positions (P, n + 1, 3), distances restantes (P,)) ;
+      sans la dimension P pour une cible unique.
+    """
+    chain = skeleton_chain(skeleton, effector)
+    _chain_base(skeleton, chain)
+    targets = np.asarray(targets, dtype=np.float64)
+    single = targets.ndim == 1
+    targets = targets.reshape(-1, 3)
+    rest = skeleton["world"][chain, :3, 3]
+    lengths = np.linalg.norm(skeleton["local"][chain[1:], :3, 3], axis=1)
+    cos_limits = None if max_bend is None else np.cos(np.radians(np.broadcast_to(max_bend, (len(chain) - 2,))))
+
+    def place(anchor, toward, length, previous=None, cos_limit=None):
+        direction = toward - anchor
+        direction /= np.maximum(np.linalg.norm(direction, axis=1, keepdims=True), 1e-12)
+        if previous is not None:
+            # Projeter la direction sur le cône autour du segment précédent
+            cos_angle = np.einsum("ij,ij->i", direction, previous)
+            outside = cos_angle < cos_limit
+            if outside.any():
+                ortho = direction[outside] - cos_angle[outside, None] * previous[outside]
+                norm = np.linalg.norm(ortho, axis=1)
+                degenerate = norm < 1e-9
+                if degenerate.any():
+                    # Direction exactement opposée : n'importe quel axe perpendiculaire au segment précédent
+                    back = previous[outside][degenerate]
+                    ortho[degenerate] = np.cross(back, np.where(np.abs(back[:, :1]) < 0.9, [[1.0, 0, 0]], [[0, 1.0, 0]]))
+                    norm[degenerate] = np.linalg.norm(ortho[degenerate], axis=1)
+                ortho /= norm[:, None]
+                sin_limit = np.sqrt(1 - cos_limit ** 2)
+                direction[outside] = cos_limit * previous[outside] + sin_limit * ortho
+        return anchor + length * direction
+
+    positions = np.repeat(rest[None], len(targets), axis=0)
+    root = rest[0]
+    active = np.ones(len(targets), dtype=bool)
+    for _ in range(iterations):
+        active &= np.linalg.norm(positions[:, -1] - targets, axis=1) > tolerance
+        if not active.any():
+            break
+        p = positions[active]
+        # Aller : de l'effecteur vers la racine
+        p[:, -1] = targets[active]
+        for k in range(len(chain) - 2, -1, -1):
+            p[:, k] = place(p[:, k + 1], p[:, k], lengths[k])
+        # Retour : de la racine vers l'effecteur, avec les limites de flexion
+        p[:, 0] = root
+        for k in range(len(chain) - 1):
+            previous = None
+            if cos_limits is not None and k > 0:
+                previous = (p[:, k] - p[:, k - 1]) / lengths[k - 1]
+            p[:, k + 1] = place(p[:, k], p[:, k + 1], lengths[k], previous, None if previous is None else cos_limits[k - 1])
+        positions[active] = p
+
+    distances = np.linalg.norm(positions[:, -1] - targets, axis=1)
+    return (chain, positions[0], distances[0]) if single else (chain, positions, distances)
+
+def fabrik_rotations(skeleton, chain, positions):
+    """
+    Rotations locales (n, 3, 3) des articulations chain[:-1] faisant passer le squelette par les positions
+    (n + 1, 3) trouvées par FABRIK : chaque segment est aligné par la rotation minimale depuis sa direction
+    dans le repère de son parent.
+    """
+    rotation = _chain_base(skeleton, chain)[:3, :3]
+    rotations = []
+    for k in range(len(chain) - 1):
+        rest = skeleton["local"][chain[k + 1], :3, 3]
+        wanted = rotation.T @ (positions[k + 1] - positions[k])
+        local = rotations_between((rest / np.linalg.norm(rest))[None], (wanted / np.linalg.norm(wanted))[None])[0]
+        rotations.append(local)
+        rotation = rotation @ local
+    return np.array(rotations)
+
+def skeleton_forward_kinematics(skeleton, rotations, joints=None):
+    """
+    Cinématique directe de tout le squelette pour P poses, niveau par niveau.
+
+    Paramètres :
+    - skeleton (dict) : Le squelette (offsets et rotations des articulations non données).
+    - rotations (np.ndarray) : Rotations locales (P, k, 3, 3) des articulations joints.
+    - joints (array-like, optionnel) : Les k articulations animées ; toutes par défaut.
+
+    Retourne :
+    - np.ndarray : Transformations monde (P, J, 4, 4).
+    """
+    rotations = np.asarray(rotations, dtype=np.float64)
+    joints = np.arange(len(skeleton["parents"])) if joints is None else np.asarray(joints)
+    local = np.repeat(skeleton["local"][None], len(rotations), axis=0)
+    local[:, joints, :3, :3] = rotations
+    world = np.empty_like(local)
+    parents = skeleton["parents"]
+    for level in skeleton["levels"]:
+        level_parents = parents[level]
+        roots = level_parents < 0
+        world[:, level[roots]] = skeleton["root_transform"] @ local[:, level[roots]]
+        world[:, level[~roots]] = world[:, level_parents[~roots]] @ local[:, level[~roots]]
+    return world
+
+def _workspace_chunk(task):
+    """Tire des poses au hasard dans les limites et compte les positions de l'effecteur par voxel."""
+    offsets, effector_offset, base, low, high, seed, nb_poses, origin, dims, voxel_size = task
+    rng = np.random.default_rng(seed)
+    angles = rng.uniform(low, high, size=(nb_poses,) + low.shape)
+    _, _, points, _ = chain_forward_kinematics(angles, offsets, effector_offset, base)
+    cells = np.floor((points - origin) / voxel_size).astype(np.int64)
+    np.clip(cells, 0, dims - 1, out=cells)
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    return np.bincount(keys, minlength=int(dims.prod())).astype(np.uint32)
+
+def sample_workspace(skeleton, effector, nb_poses, joint_limits=None, voxel_size=0.1, chunk_size=1 << 18,
+                     seed=None, max_workers=None):
+    """
+    Échantillonne l'espace atteignable par effector (Monte-Carlo) : nb_poses poses tirées uniformément
+    dans les limites articulaires, traitées par blocs (éventuellement dans plusieurs processus),
+    et accumulées dans une grille de voxels couvrant la sphère de rayon la longueur de la chaîne.
+
+    Paramètres :
+    - skeleton (dict) : Le squelette.
+    - effector (int) : L'articulation dont on cherche l'espace atteignable.
+    - nb_poses (int) : Nombre de poses tirées.
+    - joint_limits (np.ndarray, optionnel) : Bornes (n, 3, 2) en degrés, comme pour solve_ik_dls.
+    - voxel_size (float) : Taille d'un voxel.
+    - chunk_size (int) : Nombre de poses par bloc.
+    - seed (int, optionnel) : Graine pour des résultats reproductibles.
+    - max_workers (int, optionnel) : Nombre de processus ; None ou 1 pour un traitement séquentiel.
+
+    Retourne :
+    - dict : counts (grille (X, Y, Z) du nombre de poses par voxel), origin, voxel_size, nb_poses.
+    """
+    chain = skeleton_chain(skeleton, effector)
+    joints = chain[:-1]
+    base = _chain_base(skeleton, chain)
+    offsets = skeleton["local"][joints, :3, 3]
+    effector_offset = skeleton["local"][effector, :3, 3]
+    if joint_limits is None:
+        joint_limits = np.tile([-180.0, 180.0], (len(joints), 3, 1))
+    low, high = np.asarray(joint_limits[..., 0], dtype=np.float64), np.asarray(joint_limits[..., 1], dtype=np.float64)
+
+    reach = np.linalg.norm(offsets[1:], axis=1).sum() + np.linalg.norm(effector_offset)
+    centre = base[:3, :3] @ offsets[0] + base[:3, 3]
+    origin = centre - reach - voxel_size
+    dims = np.full(3, int(np.ceil(2 * (reach + voxel_size) / voxel_size)) + 1, dtype=np.int64)
+
+    sizes = [min(chunk_size, nb_poses - start) for start in range(0, nb_poses, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = ((offsets, effector_offset, base, low, high, chunk_seed, size, origin, dims, voxel_size)
+             for chunk_seed, size in zip(seeds, sizes))
+    counts = np.zeros(int(dims.prod()), dtype=np.uint32)
+    if max_workers and max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for chunk_counts in executor.map(_workspace_chunk, tasks):
+                counts += chunk_counts
+    else:
+        for chunk_counts in map(_workspace_chunk, tasks):
+            counts += chunk_counts
+    return {"counts": counts.reshape(dims), "origin": origin, "voxel_size": voxel_size, "nb_poses": nb_poses}
+
+def workspace_voxel_centers(workspace, min_count=1):
+    """Centres (K, 3) des voxels atteints par au moins min_count poses."""
+    cells = np.argwhere(workspace["counts"] >= min_count)
+    return workspace["origin"] + (cells + 0.5) * workspace["voxel_size"]
+
+def benchmark_workspace(nb_poses=10_000_000, max_workers=None):
+    """Mesure l'échantillonnage de l'espace atteignable du poignet du bras."""
+    skeleton = create_arm_skeleton()
+    debut = time.perf_counter()
+    workspace = sample_workspace(skeleton, ARM_WRIST, nb_poses, seed=0, max_workers=max_workers)
+    duree = time.perf_counter() - debut
+    occupied = np.count_nonzero(workspace["counts"])
+    volume = occupied * workspace["voxel_size"] ** 3
+    print(f"{nb_poses} poses en {duree:.2f} s ({nb_poses / duree:.3g} poses/s), "
+          f"{occupied} voxels atteints ({volume:.1f} unités³)")
+
+def skeleton_bones(skeleton):
+    """
+    Os du squelette dans la pose actuelle : un segment (parent -> articulation) par articulation non racine,
+    rattaché à l'articulation parente qui le fait tourner.
+
+    Retourne :
+    - tuple : (articulations (B,), débuts (B, 3), fins (B, 3)), triés par articulation.
+    """
+    update_world_transforms(skeleton)
+    children = np.flatnonzero(skeleton["parents"] >= 0)
+    owners = skeleton["parents"][children]
+    order = np.argsort(owners, kind="stable")
+    positions = joint_positions(skeleton)
+    return owners[order], positions[owners[order]], positions[children[order]]
+
+def bind_skin(skeleton, vertices, k=4, power=4.0, chunk_size=1 << 14):
+    """
+    Attache un maillage au squelette dans sa pose actuelle (pose de liaison) : chaque sommet garde les k
+    articulations dont les os sont les plus proches, pondérées par 1 / distance^power puis normalisées.
+
+    Paramètres :
+    - skeleton (dict) : Le squelette.
+    - vertices (np.ndarray) : Sommets (V, 3) du maillage dans la pose de liaison.
+    - k (int) : Nombre maximal d'articulations par sommet.
+    - power (float) : Exposant de la décroissance des poids avec la distance à l'os.
+    - chunk_size (int) : Nombre de sommets traités à la fois.
+
+    Retourne :
+    - dict : Peau avec les sommets de liaison, indices (V, k), poids (V, k) et inverses des matrices de liaison.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    owners, starts, ends = skeleton_bones(skeleton)
+    joints, first_bone = np.unique(owners, return_index=True)
+    k = min(k, len(joints))
+    axes = ends - starts
+    lengths2 = np.maximum(np.einsum("ij,ij->i", axes, axes), 1e-12)
+
+    indices = np.empty((len(vertices), k), dtype=np.int64)
+    weights = np.empty((len(vertices), k))
+    for start in range(0, len(vertices), chunk_size):
+        chunk = vertices[start:start + chunk_size]
+        # Distance de chaque sommet à chaque os, puis à l'os le plus proche de chaque articulation
+        relative = chunk[:, None, :] - starts[None, :, :]
+        t = np.clip(np.einsum("vbi,bi->vb", relative, axes) / lengths2, 0.0, 1.0)
+        distances = np.linalg.norm(relative - t[..., None] * axes, axis=2)
+        distances = np.minimum.reduceat(distances, first_bone, axis=1)
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        inverse = np.take_along_axis(distances, nearest, axis=1)
+        inverse = 1.0 / np.maximum(inverse, 1e-9) ** power
+        indices[start:start + len(chunk)] = joints[nearest]
+        weights[start:start + len(chunk)] = inverse / inverse.sum(axis=1, keepdims=True)
+
+    return {
+        "vertices": np.hstack([vertices, np.ones((len(vertices), 1))]),
+        "indices": indices,
+        "weights": weights,
+        "inverse_bind": np.linalg.inv(skeleton["world"]),
+    }
+
+def skin_vertices(skin, world, out=None):
+    """
+    Skinning linéaire (linear blend skinning) : chaque sommet est transformé par la moyenne pondérée des
+    matrices world @ inverse_bind de ses articulations, en un seul einsum sur tous les sommets.
+
+    Paramètres :
+    - skin (dict) : La peau retournée par bind_skin.
+    - world (np.ndarray) : Transformations monde (J, 4, 4) des articulations.
+    - out (np.ndarray, optionnel) : Tableau (V, 3) où écrire les sommets déformés.
+
+    Retourne :
+    - np.ndarray : Les sommets déformés (V, 3).
+    """
+    skinning = (world @ skin["inverse_bind"])[:, :3, :]
+    return np.einsum("vk,vkij,vj->vi", skin["weights"], skinning[skin["indices"]], skin["vertices"],
+                     optimize=["einsum_path", (0, 1), (0, 1)], out=out)
+
+def fit_mesh_to_segment(vertices, start, end, radius):
+    """
+    Place un maillage le long d'un segment : son axe le plus long est aligné sur [start, end]
+    et sa section est mise à l'échelle pour tenir dans le rayon donné.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    centred = vertices - (vertices.min(axis=0) + vertices.max(axis=0)) / 2
+    extent = centred.max(axis=0) - centred.min(axis=0)
+    order = np.argsort(extent)[::-1]
+    axis = np.asarray(end, dtype=np.float64) - start
+    length = np.linalg.norm(axis)
+    scale = np.array([length, 2 * radius, 2 * radius]) / np.maximum(extent[order], 1e-12)
+    local = centred[:, order] * scale
+    rotation = rotations_between(np.array([[1.0, 0, 0]]), (axis / length)[None])[0]
+    return local @ rotation.T + (np.asarray(start, dtype=np.float64) + axis / 2)
+
+ARM_SHOULDER, ARM_ELBOW, ARM_WRIST = 0, 1, 2
+ARM_FINGER_BASES = np.array([3, 4, 5])
+ARM_FINGER_TIPS = np.array([6, 7, 8])
+
+def create_arm_skeleton(shoulder=(0, 3, 0)):
+    """
+    Squelette du bras : épaule -> coude -> poignet -> trois doigts (base puis extrémité).
+    Les longueurs des segments sont portées par les offsets et restent donc constantes.
+    """
+    parents = [-1, ARM_SHOULDER, ARM_ELBOW, ARM_WRIST, ARM_WRIST, ARM_WRIST, 3, 4, 5]
+    offsets = [shoulder, (0, -UPPER_ARM_LENGTH, 0), (0, -FOREARM_LENGTH, 0)]
+    offsets += [(i * 0.2, -0.4, 0) for i in range(-1, 2)]
+    offsets += [(0, -FINGER_LENGTH, 0)] * 3
+    return create_skeleton(parents, offsets)
+
 def calculate_fingers_positions(wrist, wrist_rotation, FINGER_LENGTH):
     """
     Calcule les positions des doigts par rapport au poignet.
@@ -360,6 +879,19 @@ def main():
     wrist_pitch_ptr = pr.ffi.new('float *', 0.0)  # Poignet (tangage)
     wrist_roll_ptr = pr.ffi.new('float *', 0.0)  # Poignet (roulis)
 
+    skeleton = create_arm_skeleton()
+
+    # Peau : un maillage posé le long du bras au repos et déformé par skinning linéaire,
+    # chargé et attaché seulement au premier affichage
+    skin = None
+    peau_active = False
+
+    # Cinématique inverse : le poignet suit une cible réglée par curseurs
+    ik_actif = False
+    target_x_ptr = pr.ffi.new('float *', 2.0)
+    target_y_ptr = pr.ffi.new('float *', 1.0)
+    target_z_ptr = pr.ffi.new('float *', 1.0)
+
     while not pr.window_should_close():  # Boucle principale
         # Mise à jour de la position de la caméra
         update_camera_position(camera, 0.2)
@@ -368,46 +900,44 @@ def main():
         pr.clear_background(pr.RAYWHITE)  # Nettoie l'écran avec une couleur blanche
         pr.begin_mode_3d(camera)  # Active le mode 3D
 
-        # Positions initiales des articulations
-        shoulder = Vector3(0, 3, 0)  # Position de l'épaule
-        elbow = vector_add(shoulder, Vector3(0, -UPPER_ARM_LENGTH, 0))  # Position du coude
-        wrist = vector_add(elbow, Vector3(0, -FOREARM_LENGTH, 0))  # Position du poignet
-
-        # Calcul des rotations pour chaque articulation
-        shoulder_rotation = rotation_matrix_yaw_pitch_roll(
-            shoulder_yaw_ptr[0], shoulder_pitch_ptr[0], shoulder_roll_ptr[0]
-        )
-        elbow_rotation = rotation_matrix_yaw_pitch_roll(
-            elbow_yaw_ptr[0], elbow_pitch_ptr[0], elbow_roll_ptr[0]
-        )
-        wrist_rotation = rotation_matrix_yaw_pitch_roll(
-            wrist_yaw_ptr[0], wrist_pitch_ptr[0], wrist_roll_ptr[0]
-        )
-
-        # Appliquer les rotations pour déterminer les nouvelles positions des articulations
-        parent_transformation = np.eye(4)  # Transformation initiale
-        elbow_rotated, elbow_transformation = apply_transformation_to_segment(
-            elbow, shoulder_rotation, shoulder, parent_transformation)
-        
-        wrist_rotated, wrist_transformation = apply_transformation_to_segment(
-            wrist, elbow_rotation, elbow, elbow_transformation)
+        # Cinématique inverse : les angles trouvés sont reportés sur les curseurs de l'épaule et du coude
+        target = np.array([target_x_ptr[0], target_y_ptr[0], target_z_ptr[0]])
+        if ik_actif:
+            _, ik_angles, _ = solve_ik_dls(skeleton, ARM_WRIST, target, iterations=10)
+            for ptrs, joint_angles in zip(((shoulder_yaw_ptr, shoulder_pitch_ptr, shoulder_roll_ptr),
+                                           (elbow_yaw_ptr, elbow_pitch_ptr, elbow_roll_ptr)), ik_angles.tolist()):
+                for ptr, angle in zip(ptrs, joint_angles):
+                    ptr[0] = angle
+
+        # Rotations des articulations : seuls les sous-arbres dont un curseur a changé sont recalculés
+        angles = np.array([
+            [shoulder_yaw_ptr[0], shoulder_pitch_ptr[0], shoulder_roll_ptr[0]],
+            [elbow_yaw_ptr[0], elbow_pitch_ptr[0], elbow_roll_ptr[0]],
+            [wrist_yaw_ptr[0], wrist_pitch_ptr[0], wrist_roll_ptr[0]],
+        ])
+        set_joint_rotations(skeleton, [ARM_SHOULDER, ARM_ELBOW, ARM_WRIST], yaw_pitch_roll_matrices(*angles.T))
+        update_world_transforms(skeleton)
+        positions = joint_positions(skeleton)
 
         # Vérifications de la longueur des segments
-        
-        
-        shoulder_to_elbow_length = vector_length(vector_subtract(elbow_rotated, shoulder))
+        shoulder_to_elbow_length = np.linalg.norm(positions[ARM_ELBOW] - positions[ARM_SHOULDER])
         assert abs(shoulder_to_elbow_length - UPPER_ARM_LENGTH) < 1e-6, \
             f"Longueur attendue entre l'épaule et le coude : {UPPER_ARM_LENGTH}, obtenu : {shoulder_to_elbow_length}"
-        
-        elbow_to_wrist_length = vector_length(vector_subtract(wrist_rotated, elbow_rotated))
+
+        elbow_to_wrist_length = np.linalg.norm(positions[ARM_WRIST] - positions[ARM_ELBOW])
         assert abs(elbow_to_wrist_length - FOREARM_LENGTH) < 1e-6, \
             f"Longueur attendue entre le coude et le poignet : {FOREARM_LENGTH}, obtenu : {elbow_to_wrist_length}"
 
-        # Calcul des positions des doigts
-        finger_positions = calculate_fingers_positions(wrist_rotated, wrist_rotation, FINGER_LENGTH)
-
         # Dessin du bras humain
+        shoulder, elbow_rotated, wrist_rotated = (Vector3(*p) for p in positions[:3].tolist())
+        finger_positions = [(Vector3(*base), Vector3(*tip)) for base, tip in
+                            zip(positions[ARM_FINGER_BASES].tolist(), positions[ARM_FINGER_TIPS].tolist())]
         draw_human_arm(shoulder, elbow_rotated, wrist_rotated, finger_positions)
+        if peau_active:
+            skin_vertices(skin, skeleton["world"], out=skinned)
+            draw_lines_3d(skinned[skin_edges[:, 0]], skinned[skin_edges[:, 1]], pr.DARKGRAY)
+        if ik_actif:
+            pr.draw_sphere(Vector3(*target.tolist()), 0.15, pr.ORANGE)
 
         pr.end_mode_3d()
 
@@ -427,6 +957,25 @@ def main():
         pr.draw_text("Rotation du poignet :", base_x_label, 320, 20, pr.BLACK)
         draw_sliders_with_labels(base_x_label, base_x_slider, 350, 30, wrist_yaw_ptr, wrist_pitch_ptr, wrist_roll_ptr)
 
+        if pr.gui_button(pr.Rectangle(base_x_label, 440, 265, 30),
+                         "Cinématique inverse : active" if ik_actif else "Cinématique inverse : inactive"):
+            ik_actif = not ik_actif
+        draw_slider_with_label("X", base_x_label, base_x_slider, 480, target_x_ptr, -6, 6, 15)
+        draw_slider_with_label("Y", base_x_label, base_x_slider, 510, target_y_ptr, -3, 9, 15)
+        draw_slider_with_label("Z", base_x_label, base_x_slider, 540, target_z_ptr, -6, 6, 15)
+        if pr.gui_button(pr.Rectangle(base_x_label, 580, 265, 30), "Peau : affichée" if peau_active else "Peau : masquée"):
+            peau_active = not peau_active
+            if peau_active and skin is None:
+                # Liaison sur un squelette au repos, le bras affiché pouvant déjà être plié
+                rest_skeleton = create_arm_skeleton()
+                update_world_transforms(rest_skeleton)
+                rest_positions = joint_positions(rest_skeleton)
+                skin_mesh = load_ply_file("dolphin.ply")
+                skin = bind_skin(rest_skeleton, fit_mesh_to_segment(skin_mesh.vertices, rest_positions[ARM_SHOULDER],
+                                                                    rest_positions[ARM_WRIST], 0.5))
+                skin_edges = np.asarray(skin_mesh.edges_unique)
+                skinned = np.empty((len(skin["vertices"]), 3))
+
         pr.end_drawing()
 
     pr.close_window()  # Ferme la fenêtre graphique
@@ -434,4 +983,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if "--benchmark" in sys.argv:
+        benchmark_workspace()
+    else:
+        main()
\ No newline at end of file
@@ -1,5 +1,7 @@
 import pyray as pr
 import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from pyray import Vector3
 
 from TP1.exo1_2 import (cross_product,
@@ -9,7 +11,121 @@ from TP1.exo5 import (initialize_camera,update_camera_position)
 
    
 
-def generate_random_points_on_plane(point, normal, num_points=10, spread=5):
+def _plane_basis(normal):
+    """Retourne une base orthonormée (u, v, n) sous forme de matrice 3x3 (une ligne par vecteur)."""
+    n = np.asarray(normal, dtype=np.float64)
+    n = n / np.linalg.norm(n)
+    if abs(n[0]) > 1e-3 or abs(n[2]) > 1e-3:
+        u = np.array([-n[2], 0.0, n[0]])
+    else:
+        u = np.array([0.0, -n[2], n[1]])
+    u /= np.linalg.norm(u)
+    return np.stack([u, np.cross(n, u), n])
+
+def sample_points_on_plane(nb_points, point, normal, spread=5, noise=0.0, seed=None, dtype=np.float64):
+    """
+    Tire des points uniformément dans un carré du plan, décalés uniformément de [-noise, noise] le long de la normale.
+
+    Args:
+        nb_points (int): Nombre de points.
+        point, normal (array-like): Un point du plan et sa normale.
+        spread (float): Demi-côté du carré.
+        noise (float): Décalage maximal le long de la normale.
+        seed (int | np.random.SeedSequence | np.random.Generator, optional): Graine ou générateur.
+        dtype: np.float64 ou np.float32.
+
+    Returns:
+        np.ndarray: Tableau (nb_points, 3).
+    """
+    rng = np.random.default_rng(seed)
+    coords = rng.random((nb_points, 3), dtype=dtype)
+    coords *= 2
+    coords -= 1
+    coords *= np.array([spread, spread, noise], dtype=dtype)
+    points = coords @ _plane_basis(normal).astype(dtype)
+    points += np.asarray(point, dtype=dtype)
+    return points
+
+def sample_points_in_box(nb_points, pmin, pmax, seed=None, dtype=np.float64):
+    """Tire des points uniformément dans la boîte (pmin, pmax) ; retourne un tableau (nb_points, 3)."""
+    rng = np.random.default_rng(seed)
+    points = rng.random((nb_points, 3), dtype=dtype)
+    pmin = np.asarray(pmin, dtype=dtype)
+    points *= np.asarray(pmax, dtype=dtype) - pmin
+    points += pmin
+    return points
+
+def sample_points_on_sphere(nb_points, centre, radius, noise=0.0, seed=None, dtype=np.float64):
+    """
+    Tire des points uniformément sur une sphère, à une distance du centre tirée dans [radius - noise, radius + noise].
+
+    Returns:
+        np.ndarray: Tableau (nb_points, 3).
+    """
+    rng = np.random.default_rng(seed)
+    points = rng.standard_normal((nb_points, 3), dtype=dtype)
+    rayons = rng.random(nb_points, dtype=dtype)
+    rayons *= 2 * noise
+    rayons += radius - noise
+    points *= (rayons / np.linalg.norm(points, axis=1))[:, None]
+    points += np.asarray(centre, dtype=dtype)
+    return points
+
+def sample_points_on_mesh(nb_points, vertices, faces, noise=0.0, seed=None, dtype=np.float64):
+    """
+    Tire des points uniformément sur la surface d'un maillage : les triangles sont choisis proportionnellement
+    à leur aire, puis un point uniforme y est tiré (coordonnées barycentriques en racine carrée) et décalé
+    de [-noise, noise] le long de la normale du triangle.
+
+    Args:
+        vertices (np.ndarray): Sommets (V, 3).
+        faces (np.ndarray): Triangles (F, 3).
+
+    Returns:
+        np.ndarray: Tableau (nb_points, 3).
+    """
+    rng = np.random.default_rng(seed)
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces)
+    v0 = vertices[faces[:, 0]]
+    e1 = vertices[faces[:, 1]] - v0
+    e2 = vertices[faces[:, 2]] - v0
+    normales = np.cross(e1, e2)
+    aires = np.linalg.norm(normales, axis=1)
+    normales /= np.maximum(aires, 1e-300)[:, None]
+
+    cumul = np.cumsum(aires)
+    triangles = np.searchsorted(cumul, rng.random(nb_points) * cumul[-1], side="right")
+    np.minimum(triangles, len(faces) - 1, out=triangles)
+
+    r1 = np.sqrt(rng.random(nb_points, dtype=dtype))
+    r2 = rng.random(nb_points, dtype=dtype)
+    a = r1 * (1 - r2)
+    b = r1 * r2
+    decalages = (rng.random(nb_points, dtype=dtype) * 2 - 1) * noise
+
+    points = v0[triangles].astype(dtype)
+    points += a[:, None] * e1[triangles] + b[:, None] * e2[triangles] + decalages[:, None] * normales[triangles]
+    return points
+
+def sample_point_chunks(sampler, nb_points, chunk_size=1 << 20, seed=None, **kwargs):
+    """
+    Génère un grand nuage bloc par bloc ; chaque bloc a son propre flux aléatoire issu de SeedSequence.spawn,
+    si bien que le résultat ne dépend pas de l'ordre ni du processus qui produit les blocs.
+
+    Args:
+        sampler (callable): Une des fonctions sample_points_*, appelée avec (taille, **kwargs, seed=...).
+        nb_points (int): Nombre total de points.
+        chunk_size (int): Nombre de points par bloc.
+
+    Yields:
+        np.ndarray: Blocs (n, 3).
+    """
+    nb_chunks = -(-nb_points // chunk_size)
+    for index, chunk_seed in enumerate(np.random.SeedSequence(seed).spawn(nb_chunks)):
+        yield sampler(min(chunk_size, nb_points - index * chunk_size), seed=chunk_seed, **kwargs)
+
+def generate_random_points_on_plane(point, normal, num_points=10, spread=5, seed=None):
     """
     # Génère des points aléatoires situés sur un plan défini par un point et un vecteur normal.
 
@@ -18,66 +134,213 @@ def generate_random_points_on_plane(point, normal, num_points=10, spread=5):
         normal (Vector3): Le vecteur normal définissant le plan.
         num_points (int): Le nombre de points à générer.
         spread (float): L'écart maximal des points par rapport au point de référence.
+        seed (int, optional): Graine pour des résultats reproductibles.
 
     Returns:
         list: Une liste de points Vector3 situés sur le plan.
     """
+    points = sample_points_on_plane(num_points, [point.x, point.y, point.z], [normal.x, normal.y, normal.z],
+                                    spread=spread, noise=5, seed=seed)
+    return [Vector3(*p) for p in points.tolist()]
 
-    normal = vector_normalize(normal)
 
-    # Générer deux vecteurs orthogonaux dans le plan
-    if abs(normal.x) > 1e-3 or abs(normal.z) > 1e-3:
-        u = vector_normalize(Vector3(-normal.z, 0, normal.x))
-    else:
-        u = vector_normalize(Vector3(0, -normal.z, normal.y))
-    v = vector_normalize(cross_product(normal, u))
 
-    # Générer des points aléatoires dans le plan en utilisant la base orthogonale
-    points = []
-    for _ in range(num_points):
-        r1 = np.random.uniform(-spread, spread)
-        r2 = np.random.uniform(-spread, spread)
-        p = Vector3(
-            point.x + r1 * u.x + r2 * v.x,
-            point.y + r1 * u.y + r2 * v.y,
-            point.z + r1 * u.z + r2 * v.z
-        )
-        decalage = np.random.uniform(-5, 5)
-        p = Vector3(p.x + decalage * normal.x, p.y + decalage * normal.y, p.z + decalage * normal.z)
-
-        points.append(p)
+def new_plane_fit():
+    """Crée un estimateur de plan en flux : nombre de points, moyenne et matrice de dispersion 3x3."""
+    return {"count": 0, "mean": np.zeros(3), "scatter": np.zeros((3, 3))}
 
-    return points
+def plane_fit_chunk(points):
+    """
+    Calcule l'estimateur d'un bloc de points.
 
+    Args:
+        points (list | np.ndarray): Liste de Vector3 ou tableau (N, 3).
 
+    Returns:
+        dict: L'estimateur du bloc (voir new_plane_fit).
+    """
+    if not isinstance(points, np.ndarray):
+        points = np.array([[p.x, p.y, p.z] for p in points], dtype=np.float64)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    if len(points) == 0:
+        return new_plane_fit()
+    mean = points.mean(axis=0)
+    differences = points - mean
+    return {"count": len(points), "mean": mean, "scatter": differences.T @ differences}
+
+def plane_fit_merge(a, b):
+    """Fusionne deux estimateurs (formule de Chan et al.) ; l'ordre des blocs n'importe pas."""
+    if a["count"] == 0:
+        return dict(b)
+    if b["count"] == 0:
+        return dict(a)
+    count = a["count"] + b["count"]
+    delta = b["mean"] - a["mean"]
+    return {
+        "count": count,
+        "mean": a["mean"] + delta * (b["count"] / count),
+        "scatter": a["scatter"] + b["scatter"] + np.outer(delta, delta) * (a["count"] * b["count"] / count),
+    }
+
+def plane_fit_update(fit, points):
+    """Ajoute un bloc de points à l'estimateur (mise à jour de Welford par bloc) et retourne l'estimateur."""
+    return plane_fit_merge(fit, plane_fit_chunk(points))
+
+def plane_fit_result(fit):
+    """
+    Extrait le plan de l'estimateur : la normale est le vecteur propre de la plus petite valeur propre
+    de la matrice de dispersion.
 
-def compute_normal(points):
-    centre = Vector3(0, 0, 0)
-    nb_points = len(points)
-    for pt in points:
-        centre.x += pt.x
-        centre.y += pt.y
-        centre.z += pt.z
+    Returns:
+        tuple: (centre, normale, valeurs propres croissantes), tableaux numpy.
+    """
+    valeurs, vecteurs = np.linalg.eigh(fit["scatter"])
+    return fit["mean"], vecteurs[:, 0], valeurs
 
-    centre.x /= nb_points
-    centre.y /= nb_points
-    centre.z /= nb_points
+def fit_plane_streaming(chunks, max_workers=None):
+    """
+    Ajuste un plan sur un nuage de points fourni bloc par bloc, en une seule passe et en mémoire constante.
+    Les blocs peuvent être traités en parallèle : au plus 2 * max_workers blocs sont en attente.
 
-    differences = []
+    Args:
+        chunks (iterable): Itérable (éventuellement générateur) de tableaux (n, 3).
+        max_workers (int, optional): Nombre de threads ; None ou 1 pour un traitement séquentiel.
 
-    for pt in points:
+    Returns:
+        tuple: (centre, normale, valeurs propres), voir plane_fit_result.
+    """
+    fit = new_plane_fit()
+    if max_workers is None or max_workers <= 1:
+        for chunk in chunks:
+            fit = plane_fit_update(fit, chunk)
+        return plane_fit_result(fit)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(plane_fit_chunk, chunk))
+            if len(pending) >= 2 * max_workers:
+                fit = plane_fit_merge(fit, pending.popleft().result())
+        while pending:
+            fit = plane_fit_merge(fit, pending.popleft().result())
+    return plane_fit_result(fit)
 
-        diff = Vector3(pt.x - centre.x, pt.y - centre.y, pt.z - centre.z)
-        differences.append([diff.x, diff.y, diff.z])
+def compute_normal(points):
+    """Calcule la normale du plan des moindres carrés passant par les points."""
+    _, normale, _ = plane_fit_result(plane_fit_chunk(points))
+    return Vector3(normale[0], normale[1], normale[2])
 
-    _, _, Vt = np.linalg.svd(differences)
 
-    normale = Vt[-1]
 
-    return Vector3(normale[0], normale[1], normale[2])
 
 
+def _plane_hypotheses(points, rng, nb_hypotheses):
+    """Tire des plans passant par 3 points aléatoires ; retourne (normales (H, 3), décalages (H,)) des plans non dégénérés."""
+    triplets = points[rng.integers(0, len(points), size=(nb_hypotheses, 3))]
+    normales = np.cross(triplets[:, 1] - triplets[:, 0], triplets[:, 2] - triplets[:, 0])
+    longueurs = np.linalg.norm(normales, axis=1)
+    valides = longueurs > 1e-12
+    normales = normales[valides] / longueurs[valides, None]
+    return normales, -np.einsum("ij,ij->i", normales, triplets[valides, 0])
+
+def _msac_costs(points, normales, decalages, threshold, chunk_size=1 << 14):
+    """Coût MSAC de chaque hypothèse : somme des min(r², t²) sur les points, par blocs de points."""
+    couts = np.zeros(len(normales))
+    for start in range(0, len(points), chunk_size):
+        residus = points[start:start + chunk_size] @ normales.T
+        residus += decalages
+        np.abs(residus, out=residus)
+        np.minimum(residus, threshold, out=residus)
+        couts += np.einsum("ij,ij->j", residus, residus)
+    return couts
+
+def _ransac_batch(args):
+    """Évalue un lot d'hypothèses avec son propre flux aléatoire ; retourne (coût, normale, décalage) de la meilleure."""
+    points, seed, nb_hypotheses, threshold = args
+    rng = np.random.default_rng(seed)
+    normales, decalages = _plane_hypotheses(points, rng, nb_hypotheses)
+    if len(normales) == 0:
+        return np.inf, None, None
+    couts = _msac_costs(points, normales, decalages, threshold)
+    best = np.argmin(couts)
+    return couts[best], normales[best], decalages[best]
+
+def _plane_inliers(points, alive, normale, decalage, threshold, chunk_size=1 << 20):
+    """Indices des points encore actifs (masque alive) à moins de threshold du plan, par blocs contigus."""
+    inliers = []
+    for start in range(0, len(points), chunk_size):
+        proches = np.abs(points[start:start + chunk_size] @ normale + decalage) <= threshold
+        proches &= alive[start:start + chunk_size]
+        inliers.append(np.flatnonzero(proches) + start)
+    return np.concatenate(inliers) if inliers else np.empty(0, dtype=np.int64)
+
+def detect_planes(points, nb_planes=3, threshold=0.1, nb_hypotheses=512, batch_size=128,
+                  sample_size=200_000, min_inliers=3, seed=None, max_workers=None):
+    """
+    Détecte plusieurs plans successivement par RANSAC (score MSAC). Les hypothèses sont évaluées par lots
+    vectorisés sur un sous-échantillon des points restants, chaque lot ayant son propre flux aléatoire
+    (SeedSequence.spawn) ; la meilleure est affinée par moindres carrés sur ses inliers, puis ces
+    inliers sont retirés avant de chercher le plan suivant.
 
+    Args:
+        points (list | np.ndarray): Liste de Vector3 ou tableau (N, 3).
+        nb_planes (int): Nombre maximal de plans.
+        threshold (float): Distance maximale d'un inlier au plan.
+        nb_hypotheses (int): Nombre d'hypothèses par plan.
+        batch_size (int): Nombre d'hypothèses par lot.
+        sample_size (int): Nombre de points tirés pour évaluer les hypothèses.
+        min_inliers (int): Arrêt si le meilleur plan a moins d'inliers.
+        seed (int, optional): Graine pour des résultats reproductibles.
+        max_workers (int, optional): Nombre de processus ; None ou 1 pour un traitement séquentiel.
+
+    Returns:
+        list: Un dict par plan avec "centre", "normal" (tableaux (3,)) et "inliers" (indices des points).
+    """
+    if not isinstance(points, np.ndarray):
+        points = np.array([[p.x, p.y, p.z] for p in points], dtype=np.float64)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    seeds = np.random.SeedSequence(seed)
+    alive = np.ones(len(points), dtype=bool)
+    nb_remaining = len(points)
+    planes = []
+
+    executor = ProcessPoolExecutor(max_workers=max_workers) if max_workers and max_workers > 1 else None
+    try:
+        for plane_seed in seeds.spawn(nb_planes):
+            if nb_remaining < max(3, min_inliers):
+                break
+            sample_seed, *batch_seeds = plane_seed.spawn(1 + -(-nb_hypotheses // batch_size))
+            rng = np.random.default_rng(sample_seed)
+            remaining = np.flatnonzero(alive) if nb_remaining < len(points) else None
+            if nb_remaining > sample_size:
+                tirage = rng.integers(0, nb_remaining, size=sample_size)
+                sample = points[tirage if remaining is None else remaining[tirage]]
+            else:
+                sample = points if remaining is None else points[remaining]
+
+            tasks = [(sample, batch_seed, batch_size, threshold) for batch_seed in batch_seeds]
+            results = list(executor.map(_ransac_batch, tasks) if executor else map(_ransac_batch, tasks))
+            cout, normale, decalage = min(results, key=lambda result: result[0])
+            if normale is None:
+                break
+
+            # Affinage par moindres carrés sur les inliers, puis nouvelle sélection des inliers
+            inliers = _plane_inliers(points, alive, normale, decalage, threshold)
+            if len(inliers) < max(3, min_inliers):
+                break
+            centre, normale, _ = fit_plane_streaming(points[inliers[start:start + (1 << 20)]]
+                                                     for start in range(0, len(inliers), 1 << 20))
+            inliers = _plane_inliers(points, alive, normale, -normale @ centre, threshold)
+            if len(inliers) < max(3, min_inliers):
+                break
+
+            planes.append({"centre": centre, "normal": normale, "inliers": inliers})
+            alive[inliers] = False
+            nb_remaining -= len(inliers)
+    finally:
+        if executor:
+            executor.shutdown()
+    return planes
 
 
 def draw_points(points):
@@ -130,17 +393,10 @@ def main():
     # Générer des points aléatoires situés sur le plan
     points = generate_random_points_on_plane(Vector3(0, 0, 0), Vector3(1, 1, 1), num_points=10, spread=5)
     
-    normal = compute_normal(points)
-    centre_estime = Vector3(0, 0, 0)
-
-    for pt in points:
-        centre_estime.x += pt.x
-        centre_estime.y += pt.y
-        centre_estime.z += pt.z
-
-    centre_estime.x /= len(points)
-    centre_estime.y /= len(points)
-    centre_estime.z /= len(points)
+    centre, normale, _ = plane_fit_result(plane_fit_chunk(points))
+    normal = Vector3(*normale)
+    centre_estime = Vector3(*centre)
+    plans_ransac = detect_planes(points, nb_planes=1, threshold=1.0, seed=0)
 
     normale_reference = vector_normalize(Vector3(1, 1, 1))
     point_reference = Vector3(0, 0, 0)
@@ -156,9 +412,12 @@ def main():
 
         draw_plane(normal, centre_estime, size=5, couleur=pr.RED)
         draw_plane(normale_reference, point_reference, size=5, couleur=pr.GREEN)
+        for plan in plans_ransac:
+            draw_plane(Vector3(*plan["normal"]), Vector3(*plan["centre"]), size=5, couleur=pr.BLUE)
 
         pr.end_mode_3d()
         pr.draw_text("Utilisez WASD pour déplacer la caméra", 10, 10, 20, pr.DARKGRAY)
+        pr.draw_text("Moindres carrés RED, référence GREEN, RANSAC BLUE", 10, 40, 20, pr.DARKGRAY)
         pr.end_drawing()
 
     pr.close_window()
@@ -1,56 +1,18 @@
 import pyray as pr
 import numpy as np
 import math
+import sys
+import time
 from pyray import Vector3
 from TP1.exo1_2 import (cross_product,
                       vector_length,
-                      vector_normalize,dot_product)
+                      vector_normalize,dot_product,
+                      morton_codes)
 from TP1.exo5 import (initialize_camera,update_camera_position)
+from TP3.exo1 import generate_random_points_on_plane
 
    
 
-def generate_random_points_on_plane(point, normal, num_points=10, spread=5):
-    """
-    # Génère des points aléatoires situés sur un plan défini par un point et un vecteur normal.
-
-    Args:
-        point (Vector3): Un point sur le plan.
-        normal (Vector3): Le vecteur normal définissant le plan.
-        num_points (int): Le nombre de points à générer.
-        spread (float): L'écart maximal des points par rapport au point de référence.
-
-    Returns:
-        list: Une liste de points Vector3 situés sur le plan.
-    """
-
-    normal = vector_normalize(normal)
-
-    # Générer deux vecteurs orthogonaux dans le plan
-    if abs(normal.x) > 1e-3 or abs(normal.z) > 1e-3:
-        u = vector_normalize(Vector3(-normal.z, 0, normal.x))
-    else:
-        u = vector_normalize(Vector3(0, -normal.z, normal.y))
-    v = vector_normalize(cross_product(normal, u))
-
-    # Générer des points aléatoires dans le plan en utilisant la base orthogonale
-    points = []
-    for _ in range(num_points):
-        r1 = np.random.uniform(-spread, spread)
-        r2 = np.random.uniform(-spread, spread)
-        p = Vector3(
-            point.x + r1 * u.x + r2 * v.x,
-            point.y + r1 * u.y + r2 * v.y,
-            point.z + r1 * u.z + r2 * v.z
-        )
-        decalage = np.random.uniform(-5, 5)
-        p = Vector3(p.x + decalage * normal.x, p.y + decalage * normal.y, p.z + decalage * normal.z)
-
-        points.append(p)
-
-    return points
-
-
-
 def compute_normal(points):
     centre = Vector3(0, 0, 0)
     nb_points = len(points)
@@ -76,18 +38,42 @@ def compute_normal(points):
 
     return Vector3(normale[0], normale[1], normale[2])
 
+def points_to_array(points):
+    """Convertit une liste de Vector3 en tableau numpy (N, 3) ; un tableau est retourné tel quel."""
+    if isinstance(points, np.ndarray):
+        return points
+    return np.array([[p.x, p.y, p.z] for p in points], dtype=np.float64).reshape(-1, 3)
+
 def compute_aabb(points):
-    
-    
-    xs = [p.x for p in points]
-    ys = [p.y for p in points]
-    
-    zs = [p.z for p in points]
+    """
+    Calcule la boîte englobante alignée sur les axes d'un ensemble de points.
+
+    Args:
+        points (list | np.ndarray): Liste de Vector3 ou tableau (N, 3).
+
+    Returns:
+        tuple: (pmin, pmax) sous forme de Vector3 pour une liste, de tableaux (3,) pour un tableau.
+    """
+    array = points_to_array(points)
+    pmin = array.min(axis=0)
+    pmax = array.max(axis=0)
+    if isinstance(points, np.ndarray):
+        return pmin, pmax
+    return Vector3(*pmin), Vector3(*pmax)
+
+def compute_aabbs(points, offsets):
+    """
+    Calcule les boîtes englobantes de plusieurs objets dont les points sont concaténés.
 
-    pmin = Vector3(min(xs), min(ys), min(zs))
-    pmax = Vector3(max(xs), max(ys), max(zs))
+    Args:
+        points (np.ndarray): Tableau (N, 3) des points de tous les objets.
+        offsets (np.ndarray): Tableau (K + 1,) des débuts des K objets, offsets[-1] == N ; chaque objet doit avoir au moins un point.
 
-    return pmin, pmax
+    Returns:
+        tuple: (pmin, pmax), deux tableaux (K, 3).
+    """
+    starts = np.asarray(offsets)[:-1]
+    return np.minimum.reduceat(points, starts, axis=0), np.maximum.reduceat(points, starts, axis=0)
 
 
 def draw_aabb(pmin, pmax, color=pr.BLUE):
@@ -122,46 +108,596 @@ def draw_aabb(pmin, pmax, color=pr.BLUE):
     pr.draw_sphere(centroid, 0.1, color)
 
 def apply_transformation(point, matrix):
-    
-    v = np.array([point.x, point.y, point.z])
-    vt = matrix @ v
-    return Vector3(vt[0], vt[1], vt[2])
+    """Transforme un Vector3 par une matrice 3x3, 3x4 ou 4x4 (partie affine)."""
+    return transform_points([point], matrix)[0]
 
 
-def transform_points(points, matrix):
-    
-    return [apply_transformation(p, matrix) for p in points]
+def transform_points(points, matrix, out=None):
+    """
+    Transforme des points par une matrice en un seul produit matriciel (points @ M.T).
+
+    Args:
+        points (list | np.ndarray): Liste de Vector3 ou tableau (N, 3).
+        matrix (np.ndarray): Matrice 3x3, 3x4 ou 4x4 ; la dernière colonne est la translation
+            pour les matrices affines (la dernière ligne d'une 4x4 est ignorée).
+        out (np.ndarray, optional): Tableau (N, 3) float64 réutilisé pour le résultat, pour éviter
+            une allocation à chaque image.
+
+    Returns:
+        list | np.ndarray: Liste de Vector3 pour une liste, sinon le tableau (N, 3) transformé (out s'il est fourni).
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    array = points_to_array(points)
+    result = np.matmul(array, matrix[:3, :3].T, out=out)
+    if matrix.shape[1] == 4:
+        result += matrix[:3, 3]
+    if isinstance(points, np.ndarray):
+        return result
+    return [Vector3(*p) for p in result.tolist()]
+
+
+def transform_aabbs(matrices, pmin, pmax):
+    """
+    Transforme K boîtes englobantes par K matrices en une seule passe (méthode d'Arvo) :
+    le centre est transformé et la demi-étendue est multipliée par la valeur absolue de la partie linéaire.
+
+    Args:
+        matrices (np.ndarray): (K, 3, 3), (K, 3, 4) ou (K, 4, 4) ; la dernière colonne est la translation
+            pour les matrices affines. Une matrice seule est appliquée à toutes les boîtes.
+        pmin (np.ndarray): Coins minimaux (K, 3).
+        pmax (np.ndarray): Coins maximaux (K, 3).
+
+    Returns:
+        tuple: (pmin, pmax) des boîtes transformées, deux tableaux (K, 3).
+    """
+    matrices = np.asarray(matrices, dtype=np.float64)
+    pmin = np.asarray(pmin, dtype=np.float64)
+    pmax = np.asarray(pmax, dtype=np.float64)
+    linear = matrices[..., :3, :3]
+
+    centre = (pmin + pmax) / 2
+    extent = (pmax - pmin) / 2
+    nouveau_centre = np.einsum("...ij,...j->...i", linear, centre)
+    if matrices.shape[-1] == 4:
+        nouveau_centre += matrices[..., :3, 3]
+    nouveau_extent = np.einsum("...ij,...j->...i", np.abs(linear), extent)
 
+    return nouveau_centre - nouveau_extent, nouveau_centre + nouveau_extent
 
 def transform_aabb(matrix, pmin, pmax):
-    
-    centre = Vector3((pmin.x + pmax.x) / 2,
-                     (pmin.y + pmax.y) / 2,
-                     (pmin.z + pmax.z) / 2)
-    
-    extent = Vector3((pmax.x - pmin.x) / 2,
-                     (pmax.y - pmin.y) / 2,
-                     (pmax.z - pmin.z) / 2)
+    """Transforme une boîte englobante (coins Vector3) par une matrice 3x3, 3x4 ou 4x4."""
+    nouveau_pmin, nouveau_pmax = transform_aabbs(matrix, [pmin.x, pmin.y, pmin.z], [pmax.x, pmax.y, pmax.z])
+    return Vector3(*nouveau_pmin), Vector3(*nouveau_pmax)
+
+def rotations_between(a, b):
+    """Rotations minimales (N, 3, 3) amenant les vecteurs unitaires a (N, 3) sur b (N, 3) (formule de Rodrigues)."""
+    v = np.cross(a, b)
+    c = np.einsum("ij,ij->i", a, b)
+    vx = np.zeros((len(a), 3, 3))
+    vx[:, 0, 1], vx[:, 0, 2], vx[:, 1, 2] = -v[:, 2], v[:, 1], -v[:, 0]
+    vx[:, 1, 0], vx[:, 2, 0], vx[:, 2, 1] = v[:, 2], -v[:, 1], v[:, 0]
+    opposite = c < -1 + 1e-9
+    rotations = np.eye(3) + vx + (vx @ vx) / np.where(opposite, 1.0, 1 + c)[:, None, None]
+    if opposite.any():
+        # Demi-tour autour d'un axe perpendiculaire à a
+        u = np.cross(a[opposite], np.where(np.abs(a[opposite, :1]) < 0.9, [[1.0, 0, 0]], [[0, 1.0, 0]]))
+        u /= np.linalg.norm(u, axis=1)[:, None]
+        rotations[opposite] = 2 * u[:, :, None] * u[:, None, :] - np.eye(3)
+    return rotations
+
+def create_aabb_tree(capacity=64, margin=0.1):
+    """
+    Crée un arbre AABB dynamique vide (broad-phase pour objets mobiles).
+    Les noeuds sont stockés dans des tableaux plats ; une feuille a child1 == -1 et un noeud libre height == -1.
+
+    Args:
+        capacity (int): Nombre initial de noeuds alloués (les tableaux sont agrandis au besoin).
+        margin (float): Marge ajoutée autour de la boîte de chaque objet (boîte « grasse »).
 
-    nouveau_centre = apply_transformation(centre, matrix)
+    Returns:
+        dict: L'arbre.
+    """
+    return {
+        "lower": np.zeros((capacity, 3)),
+        "upper": np.zeros((capacity, 3)),
+        "parent": np.full(capacity, -1, dtype=np.int64),
+        "child1": np.full(capacity, -1, dtype=np.int64),
+        "child2": np.full(capacity, -1, dtype=np.int64),
+        "height": np.full(capacity, -1, dtype=np.int64),
+        "user": np.full(capacity, -1, dtype=np.int64),
+        "free": list(range(capacity - 1, -1, -1)),
+        "root": -1,
+        "margin": margin,
+        "build_cost": None,
+    }
+
+def _aabb_tree_grow(tree):
+    """Double la taille des tableaux de l'arbre ; les nouveaux noeuds sont ajoutés à la liste libre."""
+    capacity = len(tree["height"])
+    for key, fill in (("lower", 0.0), ("upper", 0.0), ("parent", -1), ("child1", -1),
+                      ("child2", -1), ("height", -1), ("user", -1)):
+        old = tree[key]
+        tree[key] = np.full((2 * capacity,) + old.shape[1:], fill, dtype=old.dtype)
+        tree[key][:capacity] = old
+    tree["free"] = list(range(2 * capacity - 1, capacity - 1, -1)) + tree["free"]
+
+def _aabb_tree_allocate(tree):
+    """Prend un noeud libre, en doublant la taille des tableaux si nécessaire."""
+    if not tree["free"]:
+        _aabb_tree_grow(tree)
+    node = tree["free"].pop()
+    tree["parent"][node] = -1
+    tree["child1"][node] = -1
+    tree["child2"][node] = -1
+    tree["height"][node] = 0
+    tree["user"][node] = -1
+    return node
+
+def _aabb_tree_allocate_many(tree, count):
+    """Prend count noeuds libres d'un coup (tableau d'indices)."""
+    while len(tree["free"]) < count:
+        _aabb_tree_grow(tree)
+    start = len(tree["free"]) - count
+    nodes = np.array(tree["free"][start:][::-1], dtype=np.int64)
+    del tree["free"][start:]
+    tree["parent"][nodes] = -1
+    tree["child1"][nodes] = -1
+    tree["child2"][nodes] = -1
+    tree["height"][nodes] = 0
+    tree["user"][nodes] = -1
+    return nodes
+
+def _aabb_tree_release(tree, node):
+    tree["height"][node] = -1
+    tree["free"].append(node)
+
+def _union_area(a_lower, a_upper, b_lower, b_upper):
+    """Aire de la surface de l'union de deux boîtes données par des listes de 3 flottants."""
+    dx = max(a_upper[0], b_upper[0]) - min(a_lower[0], b_lower[0])
+    dy = max(a_upper[1], b_upper[1]) - min(a_lower[1], b_lower[1])
+    dz = max(a_upper[2], b_upper[2]) - min(a_lower[2], b_lower[2])
+    return 2 * (dx * dy + dy * dz + dz * dx)
+
+def _aabb_tree_refit(tree, node):
+    """Recalcule la hauteur et la boîte d'un noeud interne à partir de ses enfants."""
+    lower, upper, height = tree["lower"], tree["upper"], tree["height"]
+    c1, c2 = tree["child1"][node], tree["child2"][node]
+    height[node] = 1 + max(height[c1], height[c2])
+    lower1, lower2 = lower[c1].tolist(), lower[c2].tolist()
+    upper1, upper2 = upper[c1].tolist(), upper[c2].tolist()
+    lower[node] = [min(lower1[0], lower2[0]), min(lower1[1], lower2[1]), min(lower1[2], lower2[2])]
+    upper[node] = [max(upper1[0], upper2[0]), max(upper1[1], upper2[1]), max(upper1[2], upper2[2])]
+
+def _aabb_tree_balance(tree, a):
+    """Effectue une rotation si les sous-arbres de a sont déséquilibrés ; retourne la nouvelle racine du sous-arbre."""
+    child1, child2, parent, height = tree["child1"], tree["child2"], tree["parent"], tree["height"]
+    if child1[a] < 0 or height[a] < 2:
+        return a
+
+    b, c = child1[a], child2[a]
+    balance = height[c] - height[b]
+    if -1 <= balance <= 1:
+        return a
+
+    # Le sous-arbre le plus haut (c si balance > 1, b sinon) remonte à la place de a
+    up = c if balance > 1 else b
+    f, g = child1[up], child2[up]
+    child1[up] = a
+    parent[up] = parent[a]
+    parent[a] = up
+    if parent[up] >= 0:
+        if child1[parent[up]] == a:
+            child1[parent[up]] = up
+        else:
+            child2[parent[up]] = up
+    else:
+        tree["root"] = up
 
-    m = matrix
-    nouveau_extent_x = abs(m[0, 0]) * extent.x + abs(m[0, 1]) * extent.y + abs(m[0, 2]) * extent.z
-    nouveau_extent_y = abs(m[1, 0]) * extent.x + abs(m[1, 1]) * extent.y + abs(m[1, 2]) * extent.z
-    nouveau_extent_z = abs(m[2, 0]) * extent.x + abs(m[2, 1]) * extent.y + abs(m[2, 2]) * extent.z
+    # Le petit-enfant le plus haut reste sous up, l'autre descend sous a
+    keep, give = (f, g) if height[f] > height[g] else (g, f)
+    child2[up] = keep
+    if balance > 1:
+        child2[a] = give
+    else:
+        child1[a] = give
+    parent[give] = a
+    _aabb_tree_refit(tree, a)
+    _aabb_tree_refit(tree, up)
+    return up
+
+def _aabb_tree_insert_leaf(tree, leaf):
+    if tree["root"] < 0:
+        tree["root"] = leaf
+        tree["parent"][leaf] = -1
+        return
+
+    lower, upper = tree["lower"], tree["upper"]
+    child1, child2 = tree["child1"], tree["child2"]
+    leaf_lower, leaf_upper = lower[leaf].tolist(), upper[leaf].tolist()
+
+    # Descente guidée par l'heuristique de surface (comme dans Box2D)
+    index = int(tree["root"])
+    while child1[index] >= 0:
+        node_lower, node_upper = lower[index].tolist(), upper[index].tolist()
+        area = _union_area(node_lower, node_upper, node_lower, node_upper)
+        combined_area = _union_area(node_lower, node_upper, leaf_lower, leaf_upper)
+        cost = 2 * combined_area
+        inheritance_cost = 2 * (combined_area - area)
+
+        best_child, best_cost = -1, np.inf
+        for child in (int(child1[index]), int(child2[index])):
+            child_lower, child_upper = lower[child].tolist(), upper[child].tolist()
+            child_cost = _union_area(child_lower, child_upper, leaf_lower, leaf_upper) + inheritance_cost
+            if child1[child] >= 0:
+                child_cost -= _union_area(child_lower, child_upper, child_lower, child_upper)
+            if child_cost < best_cost:
+                best_child, best_cost = child, child_cost
+
+        if cost < best_cost:
+            break
+        index = best_child
+
+    sibling = index
+    old_parent = tree["parent"][sibling]
+    new_parent = _aabb_tree_allocate(tree)
+    parent, child1, child2 = tree["parent"], tree["child1"], tree["child2"]
+    parent[new_parent] = old_parent
+    tree["height"][new_parent] = tree["height"][sibling] + 1
+    child1[new_parent] = sibling
+    child2[new_parent] = leaf
+    parent[sibling] = new_parent
+    parent[leaf] = new_parent
+    if old_parent >= 0:
+        if child1[old_parent] == sibling:
+            child1[old_parent] = new_parent
+        else:
+            child2[old_parent] = new_parent
+    else:
+        tree["root"] = new_parent
+
+    index = new_parent
+    while index >= 0:
+        index = _aabb_tree_balance(tree, index)
+        _aabb_tree_refit(tree, index)
+        index = parent[index]
+
+def _aabb_tree_remove_leaf(tree, leaf):
+    if leaf == tree["root"]:
+        tree["root"] = -1
+        return
+
+    parent = tree["parent"][leaf]
+    grand_parent = tree["parent"][parent]
+    sibling = tree["child2"][parent] if tree["child1"][parent] == leaf else tree["child1"][parent]
+    _aabb_tree_release(tree, parent)
+
+    if grand_parent < 0:
+        tree["root"] = sibling
+        tree["parent"][sibling] = -1
+        return
+
+    if tree["child1"][grand_parent] == parent:
+        tree["child1"][grand_parent] = sibling
+    else:
+        tree["child2"][grand_parent] = sibling
+    tree["parent"][sibling] = grand_parent
 
-    nouveau_pmin = Vector3(nouveau_centre.x - nouveau_extent_x,
-                       nouveau_centre.y - nouveau_extent_y,
-                       nouveau_centre.z - nouveau_extent_z)
-    
-    nouveau_pmax = Vector3(nouveau_centre.x + nouveau_extent_x,
-                       nouveau_centre.y + nouveau_extent_y,
-                       nouveau_centre.z + nouveau_extent_z)
-    
-    return nouveau_pmin, nouveau_pmax
+    index = grand_parent
+    while index >= 0:
+        index = _aabb_tree_balance(tree, index)
+        _aabb_tree_refit(tree, index)
+        index = tree["parent"][index]
+
+def aabb_tree_insert(tree, pmin, pmax, user_data):
+    """
+    Insère un objet dans l'arbre avec sa boîte élargie de la marge de l'arbre.
+
+    Returns:
+        int: L'identifiant du proxy (feuille) associé à l'objet.
+    """
+    leaf = _aabb_tree_allocate(tree)
+    tree["lower"][leaf] = np.asarray(pmin) - tree["margin"]
+    tree["upper"][leaf] = np.asarray(pmax) + tree["margin"]
+    tree["user"][leaf] = user_data
+    _aabb_tree_insert_leaf(tree, leaf)
+    return leaf
+
+def aabb_tree_build(tree, pmin, pmax, user_data):
+    """
+    Insère K objets d'un coup. Sur un arbre vide, les feuilles sont triées selon leur code de Morton
+    puis regroupées deux à deux niveau par niveau (construction vectorisée, arbre équilibré) ;
+    sinon elles sont insérées une par une.
+
+    Args:
+        pmin, pmax (np.ndarray): Boîtes des objets, tableaux (K, 3).
+        user_data (np.ndarray): Identifiants des objets (K,).
+
+    Returns:
+        np.ndarray: Les proxies, dans l'ordre des objets.
+    """
+    pmin = np.asarray(pmin, dtype=np.float64).reshape(-1, 3)
+    pmax = np.asarray(pmax, dtype=np.float64).reshape(-1, 3)
+    user_data = np.asarray(user_data, dtype=np.int64)
+    if tree["root"] >= 0 or len(pmin) < 2:
+        return np.array([aabb_tree_insert(tree, lo, hi, u) for lo, hi, u in zip(pmin, pmax, user_data)], dtype=np.int64)
+
+    proxies = _aabb_tree_allocate_many(tree, len(pmin))
+    tree["lower"][proxies] = pmin - tree["margin"]
+    tree["upper"][proxies] = pmax + tree["margin"]
+    tree["user"][proxies] = user_data
+    _aabb_tree_pair_up(tree, proxies)
+    return proxies
+
+def _aabb_tree_pair_up(tree, leaves):
+    """
+    Construit l'arbre au-dessus des feuilles données : tri selon leur code de Morton puis regroupement
+    deux à deux, niveau par niveau. Mémorise le coût de l'arbre obtenu (voir aabb_tree_move_batch).
+    """
+    lower, upper = tree["lower"], tree["upper"]
+    level = leaves[np.argsort(morton_codes((lower[leaves] + upper[leaves]) / 2), kind="stable")]
+    while len(level) > 1:
+        half = len(level) // 2
+        nodes = _aabb_tree_allocate_many(tree, half)
+        lower, upper, height = tree["lower"], tree["upper"], tree["height"]
+        left, right = level[0:2 * half:2], level[1:2 * half:2]
+        tree["child1"][nodes] = left
+        tree["child2"][nodes] = right
+        tree["parent"][left] = nodes
+        tree["parent"][right] = nodes
+        lower[nodes] = np.minimum(lower[left], lower[right])
+        upper[nodes] = np.maximum(upper[left], upper[right])
+        height[nodes] = 1 + np.maximum(height[left], height[right])
+        # Un noeud impair remonte tel quel au niveau suivant
+        level = np.concatenate([nodes, level[2 * half:]])
+
+    tree["root"] = int(level[0])
+    tree["parent"][tree["root"]] = -1
+    tree["build_cost"] = aabb_tree_cost(tree)
+
+def aabb_tree_cost(tree):
+    """Coût de l'arbre selon l'heuristique de surface : somme des aires des noeuds internes."""
+    internal = np.flatnonzero((tree["height"] >= 0) & (tree["child1"] >= 0))
+    d = tree["upper"][internal] - tree["lower"][internal]
+    return float(2 * (d[:, 0] * d[:, 1] + d[:, 1] * d[:, 2] + d[:, 2] * d[:, 0]).sum())
+
+def aabb_tree_rebuild(tree):
+    """Reconstruit tout l'arbre au-dessus de ses feuilles actuelles (construction de Morton vectorisée)."""
+    height, child1 = tree["height"], tree["child1"]
+    internal = np.flatnonzero((height >= 0) & (child1 >= 0))
+    leaves = np.flatnonzero((height >= 0) & (child1 < 0))
+    height[internal] = -1
+    tree["free"].extend(internal.tolist())
+    tree["root"] = -1
+    if len(leaves):
+        _aabb_tree_pair_up(tree, leaves)
+
+def _aabb_tree_refit_ancestors(tree, nodes):
+    """
+    Recalcule boîtes et hauteurs de tous les ancêtres des noeuds donnés, un niveau à la fois :
+    chaque ancêtre est traité à sa plus grande distance aux noeuds de départ, donc après ses enfants.
+    """
+    parent, child1, child2, height = tree["parent"], tree["child1"], tree["child2"], tree["height"]
+    lower, upper = tree["lower"], tree["upper"]
+    frontier = np.unique(parent[nodes])
+    frontier = frontier[frontier >= 0]
+    seen, steps = [], []
+    while len(frontier):
+        seen.append(frontier)
+        steps.append(np.full(len(frontier), len(steps)))
+        frontier = np.unique(parent[frontier])
+        frontier = frontier[frontier >= 0]
+    if not seen:
+        return
+    seen, steps = np.concatenate(seen), np.concatenate(steps)
+    order = np.lexsort((-steps, seen))
+    first = np.r_[True, seen[order][1:] != seen[order][:-1]]
+    seen, steps = seen[order][first], steps[order][first]
+    for step in range(steps.max() + 1):
+        batch = seen[steps == step]
+        c1, c2 = child1[batch], child2[batch]
+        height[batch] = 1 + np.maximum(height[c1], height[c2])
+        lower[batch] = np.minimum(lower[c1], lower[c2])
+        upper[batch] = np.maximum(upper[c1], upper[c2])
+
+def aabb_tree_remove(tree, proxy):
+    """Retire un objet de l'arbre."""
+    _aabb_tree_remove_leaf(tree, proxy)
+    _aabb_tree_release(tree, proxy)
+
+def aabb_tree_move(tree, proxy, pmin, pmax, displacement=None):
+    """
+    Met à jour la boîte d'un objet. Rien n'est fait tant que la boîte reste dans sa boîte grasse ;
+    sinon la feuille est réinsérée avec une boîte élargie de la marge (et étirée dans le sens du déplacement).
+
+    Returns:
+        bool: True si la feuille a été réinsérée.
+    """
+    pmin = np.asarray(pmin, dtype=np.float64)
+    pmax = np.asarray(pmax, dtype=np.float64)
+    if np.all(tree["lower"][proxy] <= pmin) and np.all(pmax <= tree["upper"][proxy]):
+        return False
+
+    _aabb_tree_remove_leaf(tree, proxy)
+    lower = pmin - tree["margin"]
+    upper = pmax + tree["margin"]
+    if displacement is not None:
+        lower += np.minimum(displacement, 0)
+        upper += np.maximum(displacement, 0)
+    tree["lower"][proxy] = lower
+    tree["upper"][proxy] = upper
+    _aabb_tree_insert_leaf(tree, proxy)
+    return True
+
+def aabb_tree_move_batch(tree, proxies, pmin, pmax, displacements=None, rebuild_threshold=0.5):
+    """
+    Met à jour les boîtes de K objets en un seul passage vectorisé : les objets qui sortent de leur boîte
+    grasse reçoivent une nouvelle boîte grasse sur place, puis les ancêtres touchés sont recalculés
+    niveau par niveau (sans déplacer de feuille dans l'arbre). Quand le coût de surface de l'arbre dépasse
+    de rebuild_threshold celui de sa dernière construction, l'arbre est reconstruit entièrement.
+
+    Returns:
+        np.ndarray: Les proxies dont la boîte grasse a changé.
+    """
+    proxies = np.asarray(proxies)
+    pmin = np.asarray(pmin, dtype=np.float64)
+    pmax = np.asarray(pmax, dtype=np.float64)
+    inside = np.all(tree["lower"][proxies] <= pmin, axis=1) & np.all(pmax <= tree["upper"][proxies], axis=1)
+    moved = np.flatnonzero(~inside)
+    leaves = proxies[moved]
+    if len(moved) == 0:
+        return leaves
+
+    lower = pmin[moved] - tree["margin"]
+    upper = pmax[moved] + tree["margin"]
+    if displacements is not None:
+        displacements = np.asarray(displacements, dtype=np.float64)[moved]
+        lower += np.minimum(displacements, 0)
+        upper += np.maximum(displacements, 0)
+    tree["lower"][leaves] = lower
+    tree["upper"][leaves] = upper
+    _aabb_tree_refit_ancestors(tree, leaves)
+
+    if tree["build_cost"] is None:
+        tree["build_cost"] = aabb_tree_cost(tree)
+    elif aabb_tree_cost(tree) > (1 + rebuild_threshold) * tree["build_cost"]:
+        aabb_tree_rebuild(tree)
+    return leaves
+
+def benchmark_aabb_tree(nb_objects=10_000, nb_frames=200, speed=0.02, margin=0.2, seed=0):
+    """
+    Compare, pour nb_objects boîtes en mouvement aléatoire, la mise à jour incrémentale de l'arbre
+    (aabb_tree_move_batch) à une reconstruction complète (aabb_tree_build) à chaque image.
+    """
+    rng = np.random.default_rng(seed)
+    positions = rng.uniform(0, 100, (nb_objects, 3))
+    velocities = rng.normal(scale=speed, size=(nb_objects, 3))
+    half_size = rng.uniform(0.2, 0.8, (nb_objects, 1))
+    tree = create_aabb_tree(margin=margin)
+    proxies = aabb_tree_build(tree, positions - half_size, positions + half_size, np.arange(nb_objects))
+
+    incremental = rebuild = 0.0
+    moved = 0
+    for _ in range(nb_frames):
+        positions += velocities
+        debut = time.perf_counter()
+        moved += len(aabb_tree_move_batch(tree, proxies, positions - half_size, positions + half_size))
+        incremental += time.perf_counter() - debut
+
+        debut = time.perf_counter()
+        aabb_tree_build(create_aabb_tree(margin=margin), positions - half_size, positions + half_size,
+                        np.arange(nb_objects))
+        rebuild += time.perf_counter() - debut
+
+    print(f"{nb_objects} objets, {moved / nb_frames:.0f} boîtes grasses mises à jour par image : "
+          f"incrémental {1000 * incremental / nb_frames:.2f} ms, reconstruction {1000 * rebuild / nb_frames:.2f} ms, "
+          f"coût de surface {aabb_tree_cost(tree) / tree['build_cost']:.2f} x celui de la construction")
+
+def aabb_tree_query_pairs(tree):
+    """
+    Trouve toutes les paires d'objets dont les boîtes grasses se chevauchent, par un parcours simultané
+    de l'arbre avec lui-même vectorisé niveau par niveau.
+
+    Returns:
+        np.ndarray: Tableau (P, 2) des paires de user_data.
+    """
+    root = tree["root"]
+    if root < 0:
+        return np.empty((0, 2), dtype=np.int64)
+    lower, upper = tree["lower"], tree["upper"]
+    child1, child2, height = tree["child1"], tree["child2"], tree["height"]
+
+    a = np.array([root])
+    b = np.array([root])
+    pairs = []
+    while len(a):
+        same = a == b
+        keep = same | np.all((lower[a] <= upper[b]) & (lower[b] <= upper[a]), axis=1)
+        leaf_a = child1[a] < 0
+        leaf_b = child1[b] < 0
+        keep &= ~(same & leaf_a)
+        a, b, same, leaf_a, leaf_b = a[keep], b[keep], same[keep], leaf_a[keep], leaf_b[keep]
+
+        both_leaves = leaf_a & leaf_b
+        pairs.append(np.stack([a[both_leaves], b[both_leaves]], axis=1))
+
+        # Un noeud interne avec lui-même : paires internes de chaque enfant et paire entre les deux enfants
+        s = a[same]
+        c1, c2 = child1[s], child2[s]
+        next_a = [c1, c2, c1]
+        next_b = [c1, c2, c2]
+
+        # Deux noeuds distincts : on descend dans le noeud interne le plus haut
+        different = ~same & ~both_leaves
+        split_a = different & ~leaf_a & (leaf_b | (height[a] >= height[b]))
+        split_b = different & ~split_a
+        next_a += [child1[a[split_a]], child2[a[split_a]], a[split_b], a[split_b]]
+        next_b += [b[split_a], b[split_a], child1[b[split_b]], child2[b[split_b]]]
+
+        a = np.concatenate(next_a)
+        b = np.concatenate(next_b)
+
+    leaves = np.concatenate(pairs)
+    return tree["user"][leaves]
+
+def aabb_tree_query_box(tree, pmin, pmax):
+    """Retourne les user_data des objets dont la boîte grasse chevauche la boîte (pmin, pmax)."""
+    if tree["root"] < 0:
+        return np.empty(0, dtype=np.int64)
+    pmin = np.asarray(pmin, dtype=np.float64)
+    pmax = np.asarray(pmax, dtype=np.float64)
+    nodes = np.array([tree["root"]])
+    found = []
+    while len(nodes):
+        nodes = nodes[np.all((tree["lower"][nodes] <= pmax) & (pmin <= tree["upper"][nodes]), axis=1)]
+        leaves = tree["child1"][nodes] < 0
+        found.append(nodes[leaves])
+        nodes = np.concatenate([tree["child1"][nodes[~leaves]], tree["child2"][nodes[~leaves]]])
+    return tree["user"][np.concatenate(found)]
+
+def aabb_tree_ray_cast(tree, origin, direction, max_distance=np.inf):
+    """
+    Lance un rayon dans l'arbre ; le parcours est vectorisé niveau par niveau (test des dalles).
+
+    Returns:
+        tuple: (user_data, distances d'entrée) des feuilles touchées, triées de la plus proche à la plus lointaine.
+    """
+    if tree["root"] < 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    origin = np.asarray(origin, dtype=np.float64)
+    with np.errstate(divide="ignore"):
+        inv_direction = 1.0 / np.asarray(direction, dtype=np.float64)
+
+    nodes = np.array([tree["root"]])
+    hits, distances = [], []
+    while len(nodes):
+        with np.errstate(invalid="ignore"):
+            t1 = (tree["lower"][nodes] - origin) * inv_direction
+            t2 = (tree["upper"][nodes] - origin) * inv_direction
+        t_near = np.maximum(np.nanmax(np.minimum(t1, t2), axis=1), 0)
+        t_far = np.minimum(np.nanmin(np.maximum(t1, t2), axis=1), max_distance)
+        touched = t_near <= t_far
+        nodes, t_near = nodes[touched], t_near[touched]
+
+        leaves = tree["child1"][nodes] < 0
+        hits.append(nodes[leaves])
+        distances.append(t_near[leaves])
+        nodes = np.concatenate([tree["child1"][nodes[~leaves]], tree["child2"][nodes[~leaves]]])
+
+    hits = np.concatenate(hits)
+    distances = np.concatenate(distances)
+    order = np.argsort(distances)
+    return tree["user"][hits[order]], distances[order]
+
+def draw_aabb_tree(tree, leaf_color=pr.ORANGE, node_color=pr.LIGHTGRAY):
+    """Dessine les boîtes de tous les noeuds de l'arbre (feuilles et noeuds internes)."""
+    for node in np.flatnonzero(tree["height"] >= 0):
+        color = leaf_color if tree["child1"][node] < 0 else node_color
+        draw_aabb(Vector3(*tree["lower"][node]), Vector3(*tree["upper"][node]), color)
 
 def draw_points(points, size=0.1, color=pr.RED):
-    """Dessiner le point 3Ds."""
+    """Dessiner le point 3Ds (liste de Vector3 ou tableau (N, 3))."""
+    if isinstance(points, np.ndarray):
+        points = [Vector3(*p) for p in points.tolist()]
     for point in points:
         pr.draw_sphere(point,size, color)  
 
@@ -211,6 +747,8 @@ def main():
     points = generate_random_points_on_plane(Vector3(0, 0, 0), Vector3(1, 1, 1), num_points=10, spread=5)
     
     orig_pmin, orig_pmax = compute_aabb(points)
+    points_array = points_to_array(points)
+    transformed_points = np.empty_like(points_array)
     
     centre_estime = Vector3(0, 0, 0)
 
@@ -226,6 +764,11 @@ def main():
     normale_reference = vector_normalize(Vector3(1, 1, 1))
     point_reference = Vector3(0, 0, 0)
 
+    # Arbre AABB dynamique : chaque point transformé est un petit objet mobile
+    point_half_size = 0.1
+    point_tree = create_aabb_tree(margin=0.3)
+    point_proxies = None
+
     while not pr.window_should_close():
         update_camera_position(camera, 0.5)
 
@@ -235,10 +778,18 @@ def main():
                       [-math.sin(angle), 0, math.cos(angle)]])
 
 
-        transformed_points = transform_points(points, M)
-        trans_pts_pmin, trans_pts_pmax = compute_aabb(transformed_points)
+        transform_points(points_array, M, out=transformed_points)
+        trans_pts_pmin, trans_pts_pmax = (Vector3(*p) for p in compute_aabb(transformed_points))
         trans_box_pmin, trans_box_pmax = transform_aabb(M, orig_pmin, orig_pmax)
 
+        # Seuls les points sortis de leur boîte grasse mettent à jour l'arbre
+        if point_proxies is None:
+            point_proxies = aabb_tree_build(point_tree, transformed_points - point_half_size,
+                                            transformed_points + point_half_size, np.arange(len(transformed_points)))
+            reinserted = point_proxies
+        else:
+            reinserted = aabb_tree_move_batch(point_tree, point_proxies, transformed_points - point_half_size,
+                                              transformed_points + point_half_size)
 
         pr.begin_drawing()
         pr.clear_background(pr.RAYWHITE)
@@ -253,6 +804,7 @@ def main():
 
         draw_aabb(trans_box_pmin, trans_box_pmax, color=pr.ORANGE)
 
+        draw_aabb_tree(point_tree, leaf_color=pr.DARKGREEN, node_color=pr.LIGHTGRAY)
        
 
         pr.end_mode_3d()
@@ -263,9 +815,13 @@ def main():
         pr.draw_text("Points transformés GREEN", 10, 100, 20, pr.GREEN)
         pr.draw_text("AABB points transformés PURPLE", 10, 130, 20, pr.PURPLE)
         pr.draw_text("AABB transformée de l'AABB ORANGE", 10, 160, 20, pr.ORANGE)
+        pr.draw_text(f"Arbre AABB : {len(reinserted)} feuilles mises à jour", 10, 190, 20, pr.DARKGREEN)
         pr.end_drawing()
 
     pr.close_window()
     
 if __name__ == "__main__":
-    main()
+    if "--benchmark" in sys.argv:
+        benchmark_aabb_tree()
+    else:
+        main()
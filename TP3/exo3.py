@@ -5,53 +5,15 @@ import trimesh
 from pyray import Vector3
 from TP1.exo1_2 import (cross_product,
                       vector_length,
-                      vector_normalize,dot_product)
-from TP1.exo5 import (initialize_camera,update_camera_position,compute_face_normals,draw_mesh,compute_vertex_normals,draw_face_normals,draw_vertex_normals)
+                      vector_normalize,dot_product,
+                      camera_frustum_planes,new_cull_stats,build_cull_index)
+from TP1.exo5 import (initialize_camera,update_camera_position,compute_face_normals,draw_mesh,compute_vertex_normals,draw_face_normals,draw_vertex_normals,
+                       build_triangle_index,pick_mesh,draw_picked_face)
+from TP3.exo1 import generate_random_points_on_plane
+from TP3.exo2 import (compute_aabb,transform_aabb,transform_points)
 
    
 
-def generate_random_points_on_plane(point, normal, num_points=10, spread=5):
-    """
-    # Génère des points aléatoires situés sur un plan défini par un point et un vecteur normal.
-
-    Args:
-        point (Vector3): Un point sur le plan.
-        normal (Vector3): Le vecteur normal définissant le plan.
-        num_points (int): Le nombre de points à générer.
-        spread (float): L'écart maximal des points par rapport au point de référence.
-
-    Returns:
-        list: Une liste de points Vector3 situés sur le plan.
-    """
-
-    normal = vector_normalize(normal)
-
-    # Générer deux vecteurs orthogonaux dans le plan
-    if abs(normal.x) > 1e-3 or abs(normal.z) > 1e-3:
-        u = vector_normalize(Vector3(-normal.z, 0, normal.x))
-    else:
-        u = vector_normalize(Vector3(0, -normal.z, normal.y))
-    v = vector_normalize(cross_product(normal, u))
-
-    # Générer des points aléatoires dans le plan en utilisant la base orthogonale
-    points = []
-    for _ in range(num_points):
-        r1 = np.random.uniform(-spread, spread)
-        r2 = np.random.uniform(-spread, spread)
-        p = Vector3(
-            point.x + r1 * u.x + r2 * v.x,
-            point.y + r1 * u.y + r2 * v.y,
-            point.z + r1 * u.z + r2 * v.z
-        )
-        decalage = np.random.uniform(-5, 5)
-        p = Vector3(p.x + decalage * normal.x, p.y + decalage * normal.y, p.z + decalage * normal.z)
-
-        points.append(p)
-
-    return points
-
-
-
 def compute_normal(points):
     centre = Vector3(0, 0, 0)
     nb_points = len(points)
@@ -77,20 +39,6 @@ def compute_normal(points):
 
     return Vector3(normale[0], normale[1], normale[2])
 
-def compute_aabb(points):
-    
-    
-    xs = [p.x for p in points]
-    ys = [p.y for p in points]
-    
-    zs = [p.z for p in points]
-
-    pmin = Vector3(min(xs), min(ys), min(zs))
-    pmax = Vector3(max(xs), max(ys), max(zs))
-
-    return pmin, pmax
-
-
 def draw_aabb(pmin, pmax, color=pr.BLUE):
    
     c1 = Vector3(pmin.x, pmin.y, pmin.z)
@@ -122,47 +70,10 @@ def draw_aabb(pmin, pmax, color=pr.BLUE):
                        (pmin.z + pmax.z) / 2)
     pr.draw_sphere(centroid, 0.1, color)
 
-def apply_transformation(point, matrix):
-    
-    v = np.array([point.x, point.y, point.z])
-    vt = matrix @ v
-    return Vector3(vt[0], vt[1], vt[2])
-
-
-def transform_points(points, matrix):
-    
-    return [apply_transformation(p, matrix) for p in points]
-
-
-def transform_aabb(matrix, pmin, pmax):
-    
-    centre = Vector3((pmin.x + pmax.x) / 2,
-                     (pmin.y + pmax.y) / 2,
-                     (pmin.z + pmax.z) / 2)
-    
-    extent = Vector3((pmax.x - pmin.x) / 2,
-                     (pmax.y - pmin.y) / 2,
-                     (pmax.z - pmin.z) / 2)
-
-    nouveau_centre = apply_transformation(centre, matrix)
-
-    m = matrix
-    nouveau_extent_x = abs(m[0, 0]) * extent.x + abs(m[0, 1]) * extent.y + abs(m[0, 2]) * extent.z
-    nouveau_extent_y = abs(m[1, 0]) * extent.x + abs(m[1, 1]) * extent.y + abs(m[1, 2]) * extent.z
-    nouveau_extent_z = abs(m[2, 0]) * extent.x + abs(m[2, 1]) * extent.y + abs(m[2, 2]) * extent.z
-
-    nouveau_pmin = Vector3(nouveau_centre.x - nouveau_extent_x,
-                       nouveau_centre.y - nouveau_extent_y,
-                       nouveau_centre.z - nouveau_extent_z)
-    
-    nouveau_pmax = Vector3(nouveau_centre.x + nouveau_extent_x,
-                       nouveau_centre.y + nouveau_extent_y,
-                       nouveau_centre.z + nouveau_extent_z)
-    
-    return nouveau_pmin, nouveau_pmax
-
 def draw_points(points, size=0.1, color=pr.RED):
-    """Dessiner le point 3Ds."""
+    """Dessiner le point 3Ds (liste de Vector3 ou tableau (N, 3))."""
+    if isinstance(points, np.ndarray):
+        points = [Vector3(*p) for p in points.tolist()]
     for point in points:
         pr.draw_sphere(point,size, color)  
 
@@ -211,9 +122,14 @@ def main():
     ply_file_path = "dolphin.ply"  # Remplacez par le chemin de votre fichier PLY
     mesh = trimesh.load(ply_file_path)
     points = [Vector3(v[0], v[1], v[2]) for v in mesh.vertices]
+    points_array = np.asarray(mesh.vertices, dtype=np.float64)
+    transformed_points = np.empty_like(points_array)
 
     face_normals = compute_face_normals(mesh)
     vertex_normals = compute_vertex_normals(mesh, face_normals)
+    triangle_index = build_triangle_index(mesh.vertices, mesh.faces)
+    cull_index = build_cull_index(mesh.vertices, mesh.faces, mesh.edges)
+    picked_face, picked_vertex, picked_distance = -1, -1, np.inf
     
     # Générer des points aléatoires situés sur le plan    
 
@@ -236,6 +152,8 @@ def main():
 
     while not pr.window_should_close():
         update_camera_position(camera, 0.5)
+        if pr.is_mouse_button_pressed(pr.MOUSE_BUTTON_LEFT):
+            picked_face, picked_vertex, _, picked_distance = pick_mesh(camera, mesh, triangle_index)
 
         angle = pr.get_time() * 0.5 
         M = np.array([[math.cos(angle), 0, math.sin(angle)],
@@ -243,8 +161,8 @@ def main():
                       [-math.sin(angle), 0, math.cos(angle)]])
 
 
-        transformed_points = transform_points(points, M)
-        trans_pts_pmin, trans_pts_pmax = compute_aabb(transformed_points)
+        transform_points(points_array, M, out=transformed_points)
+        trans_pts_pmin, trans_pts_pmax = (Vector3(*p) for p in compute_aabb(transformed_points))
         trans_box_pmin, trans_box_pmax = transform_aabb(M, orig_pmin, orig_pmax)
 
 
@@ -252,9 +170,12 @@ def main():
         pr.clear_background(pr.RAYWHITE)
         pr.begin_mode_3d(camera)
 
-        draw_mesh(mesh)              # Affiche les sommets, arêtes et faces du fichier PLY
-        draw_face_normals(face_normals)  # Affiche les normales des faces
-        draw_vertex_normals(mesh, vertex_normals)  # Affiche les normales des sommets            # Affiche les sommets, arêtes et faces du fichier PLY
+        frustum = camera_frustum_planes(camera, pr.get_screen_width(), pr.get_screen_height())
+        cull_stats = new_cull_stats()
+        draw_mesh(mesh, frustum, cull_stats, cull_index)  # Affiche les sommets, arêtes et faces du fichier PLY
+        draw_face_normals(face_normals, frustum, cull_stats)  # Affiche les normales des faces
+        draw_vertex_normals(mesh, vertex_normals, frustum, cull_stats)  # Affiche les normales des sommets            # Affiche les sommets, arêtes et faces du fichier PLY
+        draw_picked_face(mesh, picked_face, picked_vertex)
 
         draw_points(points, size=0.1, color=pr.RED)
         draw_aabb(orig_pmin, orig_pmax, color=pr.BLUE)
@@ -274,6 +195,10 @@ def main():
         pr.draw_text("Points transformés GREEN", 10, 100, 20, pr.GREEN)
         pr.draw_text("AABB points transformés PURPLE", 10, 130, 20, pr.PURPLE)
         pr.draw_text("AABB transformée de l'AABB ORANGE", 10, 160, 20, pr.ORANGE)
+        if picked_face >= 0:
+            pr.draw_text(f"Face {picked_face}, sommet {picked_vertex}, distance {picked_distance:.2f}", 10, 190, 20, pr.DARKGRAY)
+        pr.draw_text(f"Culling : {cull_stats['tested']} testés, {cull_stats['culled']} éliminés, {cull_stats['drawn']} dessinés",
+                     10, 220, 20, pr.DARKGRAY)
         pr.end_drawing()
 
     pr.close_window()